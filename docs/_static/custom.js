@@ -1,25 +1,10 @@
+// No jQuery here so pages do not need it. Loaded with defer so the document has been parsed.
 
-// Add zoom to images.
-$(document).ready(_ => mediumZoom(".main .content img"))
-// Make external links open new window/tab.
-$(document).ready(_ => $("a.reference.external").attr("target", "_blank"))
-
-// Taken from: https://stackoverflow.com/a/8747204
-jQuery.expr[':'].icontains = (a, i, m) => jQuery(a).text().toUpperCase().indexOf(m[3].toUpperCase()) >= 0
-
-// Adapted from: https://stackoverflow.com/a/4106957
-jQuery.fn.textNodes = function () {
-    return this.contents().filter(function () {
-        return (this.nodeType === Node.TEXT_NODE && this.nodeValue.trim() !== "")
-    })
+// Add zoom to images. Not available for offline builds.
+if (typeof mediumZoom !== "undefined") {
+    mediumZoom(".main .content img:not(.no-zoom)")
 }
 
-const RENDER_PIPELINES = [
-    "birp",
-    "hdrp",
-    "urp",
-]
-
 const isLocalHost = location.hostname === "localhost" || location.hostname === "127.0.0.1" || location.hostname === ""
 const isLatest = window.location.pathname.startsWith("/en/latest/") || isLocalHost
 const isStable = window.location.pathname.startsWith("/en/stable/")
@@ -27,108 +12,129 @@ const version = isLocalHost ? "latest" : window.location.pathname.split("/").fil
 // NOTE: regex could be expanded to support pre-release versions (eg 1.0-alpha).
 const isVersion = !isLatest && !isStable && /^[\dX]+(?:\.[\dX]+)*$/i.test(version)
 
-function updateLinksWithRenderPipeline(renderPipeline) {
-    $("a.reference.internal").attr("href", (_, href) => {
-        const url = new URL(href, window.location)
-        url.searchParams.set("rp", renderPipeline)
-        // We are replacing Sphinx's relative URLs with absolute URLs as a side-effect. Should be okay.
-        return url.href
-    })
+// Add support for RP URL parameter. Render pipeline tabs are marked with data-rp when building (see pipelines.py).
+let renderPipeline = new URLSearchParams(window.location.search).get("rp")
+
+if (renderPipeline != null) {
+    document.querySelectorAll(`input.tab-input[data-rp="${CSS.escape(renderPipeline.toLowerCase())}"]`)
+        .forEach(input => input.checked = true)
 }
 
-function updateLocationWithRenderPipeline(renderPipeline) {
+document.addEventListener("change", event => {
+    const tabName = event.target.dataset?.rp
+    if (tabName == null) return
+    renderPipeline = tabName
     const url = new URL(window.location)
     url.searchParams.set("rp", renderPipeline)
     // Changes the URL without reloading.
     window.history.pushState({}, "", url)
-}
+})
 
-// Add support for RP URL parameter.
-$(document).ready(_ => {
-    const renderPipeline = new URLSearchParams(window.location.search).get('rp')
-    if (renderPipeline != null) {
-        $(`.tab-label:icontains("${renderPipeline}")`).click()
-        updateLinksWithRenderPipeline(renderPipeline)
-    }
-    $(".tab-label").click(x => {
-        const tabName = $(x.target).text().toLowerCase()
-        // Check that the tab is actually a render pipeline tab.
-        if (RENDER_PIPELINES.includes(tabName)) {
-            updateLinksWithRenderPipeline(tabName)
-            updateLocationWithRenderPipeline(tabName)
-        }
-    })
-
-    // Add "(unreleased)" to the latest version when not viewing a stable release.
-    if (isLatest && window.location.pathname.endsWith("history.html")) {
-        const headingNode = $("#version h2").textNodes().first()
-        headingNode.replaceWith(headingNode.text() + " (unreleased)")
+// Links are updated when followed rather than all of them whenever the render pipeline changes.
+function updateLink(event) {
+    const link = event.target.closest?.("a.reference")
+    if (link == null) return
+
+    // Make external links open new window/tab.
+    if (link.classList.contains("external")) {
+        link.target = "_blank"
+    } else if (link.classList.contains("internal") && renderPipeline != null) {
+        const url = new URL(link.href, window.location)
+        url.searchParams.set("rp", renderPipeline)
+        // We are replacing Sphinx's relative URLs with absolute URLs as a side-effect. Should be okay.
+        link.href = url.href
     }
+}
+
+// Covers middle click and copying the link too.
+for (const type of ["click", "auxclick", "contextmenu"]) {
+    document.addEventListener(type, updateLink)
+}
+
+// Swap YouTube thumbnails for the player when clicked.
+document.addEventListener("click", event => {
+    const link = event.target.closest("a[data-youtube-id]")
+    if (link == null) return
+    event.preventDefault()
+    const iframe = document.createElement("iframe")
+    iframe.src = `https://www.youtube-nocookie.com/embed/${link.dataset.youtubeId}?autoplay=1`
+    iframe.width = "100%"
+    iframe.height = "100%"
+    iframe.allow = "accelerometer; autoplay; clipboard-write; encrypted-media; gyroscope; picture-in-picture"
+    iframe.allowFullscreen = true
+    iframe.setAttribute("frameborder", "0")
+    link.replaceWith(iframe)
+})
+
+// Add "(unreleased)" to the latest version when not viewing a stable release.
+if (isLatest && window.location.pathname.endsWith("history.html")) {
+    const heading = document.querySelector("#version h2")
+    const headingNode = heading && [...heading.childNodes]
+        .find(x => x.nodeType === Node.TEXT_NODE && x.nodeValue.trim() !== "")
+    if (headingNode) headingNode.nodeValue += " (unreleased)"
+}
+
+if (isLatest) {
+    // Adapted from:
+    // https://github.com/godotengine/godot-docs/blob/21979b61badb5dd9d46c9859824fd0f0c0205bbd/_static/js/custom.js#L212-L228
+    // Add a compatibility notice using JavaScript so it doesn't end up in the automatically generated
+    // `meta description` tag.
+    const stableUrl = location.href.replace('/latest/', '/stable/')
+    document.querySelector("article[role='main']")?.insertAdjacentHTML("afterbegin", `
+        <div class="admonition attention">
+            <p class="admonition-title">Attention</p>
+            <p>
+                You are reading the <code class="docutils literal notranslate"><span class="pre">latest</span></code>
+                (unstable) version of this documentation, which may document features not available
+                or compatible with the latest <em>Crest</em> packages released on the <em>Unity Asset Store</em>.
+            </p>
+            <p class="last">
+                View the <a class="reference" href="${stableUrl}">stable version of this page</a>.
+            </p>
+        </div>
+    `)
+}
 
-    if (isLatest) {
-        // Adapted from:
-        // https://github.com/godotengine/godot-docs/blob/21979b61badb5dd9d46c9859824fd0f0c0205bbd/_static/js/custom.js#L212-L228
-        // Add a compatibility notice using JavaScript so it doesn't end up in the automatically generated
-        // `meta description` tag.
-        const stableUrl = location.href.replace('/latest/', '/stable/')
-        $("article[role='main']").prepend(`
-            <div class="admonition attention">
+// Redirect to latest documentation when visitor lands on an unpublished version.
+if (typeof isPage404 !== 'undefined' && isPage404 && isVersion) {
+    const redirect = _ => {
+        var newUrl = new URL(window.location)
+        if (!newUrl.pathname.endsWith("/") && !newUrl.pathname.endsWith(".html")) newUrl.pathname += "/"
+        newUrl.href = newUrl.href.replace(`/${version}/`, "/latest/")
+        document.getElementById("404-page-script").insertAdjacentHTML("beforebegin", `
+            <div id="404-admonition" class="admonition attention">
                 <p class="admonition-title">Attention</p>
-                <p>
-                    You are reading the <code class="docutils literal notranslate"><span class="pre">latest</span></code>
-                    (unstable) version of this documentation, which may document features not available
-                    or compatible with the latest <em>Crest</em> packages released on the <em>Unity Asset Store</em>.
-                </p>
                 <p class="last">
-                    View the <a class="reference" href="${stableUrl}">stable version of this page</a>.
+                    Looks like you are on a version without a published tag.
+                    We will redirect you to the latest documentation automatically.
+                    If it does not redirect automatically in a few seconds, please click the follow:
+                    <a href="${newUrl.href}">${newUrl.href}</a>
                 </p>
             </div>
         `)
+
+        window.location.replace(newUrl)
     }
-})
 
-// Redirect to latest documentation when visitor lands on an unpublished version.
-if (typeof isPage404 !== 'undefined' && isPage404 && isVersion) {
-    $.ajax({
-        type: "HEAD",
-        url: `/en/${version}/`,
-        error: _ => {
-            var newUrl = new URL(window.location)
-            if (!newUrl.pathname.endsWith("/") && !newUrl.pathname.endsWith(".html")) newUrl.pathname += "/"
-            newUrl.href = newUrl.href.replace(`/${version}/`, "/latest/")
-            $("#404-page-script").before(`
-                <div id="404-admonition" class="admonition attention">
-                    <p class="admonition-title">Attention</p>
-                    <p class="last">
-                        Looks like you are on a version without a published tag.
-                        We will redirect you to the latest documentation automatically.
-                        If it does not redirect automatically in a few seconds, please click the follow:
-                        <a href="${newUrl.href}">${newUrl.href}</a>
-                    </p>
-                </div>
-            `)
-
-            window.location.replace(newUrl)
-        }
-    })
+    fetch(`/en/${version}/`, { method: "HEAD" }).then(response => response.ok || redirect(), redirect)
 }
 
 // Light/Dark mode support for UAS store widgets.
 if (window.matchMedia) {
     function applyLightOrDarkMode(isDarkMode) {
-        const iframes = $("iframe.asset-store")
-        if (iframes.length == 0) return
         // NOTE: Not robust. Will break if we remove the question mark.
         const dark = "/widget-wide?"
         const light = "/widget-wide-light?"
         const oldWidget = isDarkMode ? light : dark
         const newWidget = isDarkMode ? dark : light
 
-        if (iframes.attr("src").includes(oldWidget)) {
-            iframes.attr("src", iframes.attr("src").replace(oldWidget, newWidget))
-        }
+        document.querySelectorAll("iframe.asset-store").forEach(iframe => {
+            if (iframe.src.includes(oldWidget)) {
+                iframe.src = iframe.src.replace(oldWidget, newWidget)
+            }
+        })
     }
 
-    $(document).ready(_ => applyLightOrDarkMode(window.matchMedia('(prefers-color-scheme: dark)').matches))
+    applyLightOrDarkMode(window.matchMedia('(prefers-color-scheme: dark)').matches)
     window.matchMedia('(prefers-color-scheme: dark)').addEventListener('change', event => applyLightOrDarkMode(event.matches))
 }
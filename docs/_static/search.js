@@ -0,0 +1,45 @@
+// Loads only the shards of the search index that a query needs (see extensions/search.py) instead of searchindex.js.
+// Uses splitQuery, Stemmer and stopwords from searchtools.js and language_data.js so terms match what Sphinx looks up.
+(() => {
+    const root = document.currentScript.dataset.index
+    const shards = new Map()
+    let meta = null
+
+    const fetchJson = name => fetch(`${root}/${name}`).then(response => response.json())
+
+    async function loadIndex(query) {
+        const start = performance.now()
+        meta ??= await fetchJson("meta.json")
+
+        const stemmer = new Stemmer()
+        const names = new Set()
+        for (const term of splitQuery(query.toLowerCase().trim())) {
+            if (stopwords.includes(term)) continue
+            const word = stemmer.stemWord(term.replace(/^-/, ""))
+            // By code point and lowercased, as the prefixes are in search.py.
+            names.add(meta.shards[[...word].slice(0, meta.length).join("").toLowerCase()] ?? null)
+        }
+        names.delete(null)
+
+        await Promise.all([...names].filter(name => !shards.has(name)).map(async name => {
+            shards.set(name, await fetchJson(name))
+        }))
+
+        const terms = {}
+        const titleterms = {}
+        for (const shard of shards.values()) {
+            Object.assign(terms, shard.terms)
+            Object.assign(titleterms, shard.titleterms)
+        }
+        console.debug(`search: ${names.size} shards for the query loaded in ${Math.round(performance.now() - start)} ms`)
+        return { ...meta.index, terms, titleterms }
+    }
+
+    // The query waits for the index (see Search.deferQuery) which is loaded for each query.
+    const performSearch = Search.performSearch
+    Search.performSearch = query => {
+        Search._index = null
+        performSearch(query)
+        loadIndex(query).then(index => Search.setIndex(index))
+    }
+})()
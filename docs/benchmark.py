@@ -0,0 +1,378 @@
+#!/usr/bin/env python3
+
+# Benchmarks the build against generated documents to see how it scales. One corpus uses the defaults and the others
+# change one thing each (eg --pages 20 80 320 adds corpora with 80 and 320 pages). Each corpus is built from scratch in
+# a new process per parallel job count, timing the phases:
+#   setup:   creating Sphinx (config and extensions)
+#   read:    parsing the documents (eg set, get, only blocks and embeds)
+#   resolve: post-transforms and references when writing (eg global variables, label stripping and BlockOnly)
+#   write:   the rest of writing (eg translating and templating)
+# The peak memory of the build (including parallel processes) is recorded too.
+#
+# The results can be compared between commits:
+#   python3 benchmark.py -o before.json
+#   python3 benchmark.py -o after.json
+#   python3 benchmark.py --compare before.json after.json
+#
+# Usage: make benchmark (or python3 benchmark.py [-j 1 auto] [--pages 20 80] [--repeat 1] [--no-docs])
+# Results are written to _build/benchmark.json unless given -o.
+
+import argparse
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+SOURCE_DIRECTORY = os.path.dirname(os.path.abspath(__file__))
+EXTENSIONS_DIRECTORY = os.path.join(SOURCE_DIRECTORY, "extensions")
+OUTPUT_PATH = os.path.join(SOURCE_DIRECTORY, "_build", "benchmark.json")
+
+# Bump when the results change meaning so they are not compared with older ones.
+FORMAT_VERSION = 1
+
+DEFAULTS = {
+    # Documents.
+    "pages": 20,
+    # Global variables in variables_prolog.
+    "globals": 50,
+    # Variables set in each page.
+    "sets": 10,
+    # Variables used (get role, brace substitution and links) in each page.
+    "gets": 50,
+    # Nested line_block and bullet_list directives with only blocks in each page.
+    "blocks": 5,
+    # YouTube and Trello embeds in each page.
+    "embeds": 2,
+}
+
+PHASES = ("setup", "read", "resolve", "write", "total")
+
+# Same as RTDs so the only blocks are kept.
+TAGS = ["birp", "hdrp", "urp"]
+
+CONFIG = """
+import sys
+sys.path.insert(0, {extensions!r})
+project = "Benchmark"
+extensions = ["variables", "tags", "hacks", "links", "youtube", "trello"]
+html_theme = "furo"
+default_role = "get"
+variables_prolog = {prolog!r}
+"""
+
+
+def generate_prolog(corpus):
+    lines = [f".. set:: [{x.upper()}] :guilabel:`{x.upper()}`" for x in TAGS]
+    for index in range(corpus["globals"]):
+        # A mix of what conf.py has: plain text, markup and values using other values.
+        if index % 3 == 0:
+            lines.append(f".. set:: Global{index} :abbr:`G{index} (Global Variable {index})`")
+        elif index % 3 == 1:
+            lines.append(f".. set:: Global{index} *Global {index}*")
+        else:
+            lines.append(f".. set:: Global{index} {{Global{index - 1}}} and {{Global{index - 2}}}")
+    return "\n".join(lines) + "\n"
+
+
+def generate_page(corpus, page):
+    def get_global(index):
+        return f"Global{(page * 7 + index) % corpus['globals']}" if corpus["globals"] else None
+
+    lines = [f"Page {page}", "=" * len(f"Page {page}"), ""]
+
+    for index in range(corpus["sets"]):
+        value = get_global(index)
+        lines.append(f".. set:: Local{index} Local {index} for `{value}`" if value else f".. set:: Local{index} Local")
+    lines.append("")
+
+    names = [get_global(x) for x in range(min(corpus["globals"], corpus["gets"]))]
+    names += [f"Local{x}" for x in range(corpus["sets"])]
+    paragraph = []
+    for index in range(corpus["gets"] if names else 0):
+        name = names[index % len(names)]
+        if index % 5 == 4:
+            paragraph.append(f":link:`Link to {{{name}}} <https://example.com/{page}/{index}>`")
+        else:
+            paragraph.append(f"Text using `{name}`.")
+        if len(paragraph) == 10:
+            lines += [" ".join(paragraph), ""]
+            paragraph = []
+    if paragraph:
+        lines += [" ".join(paragraph), ""]
+
+    for index in range(corpus["blocks"]):
+        value = f" `{get_global(index)}`" if corpus["globals"] else ""
+        if index % 2 == 0:
+            lines += [
+                ".. bullet_list::",
+                "",
+                f"   -  Item{value}",
+                "",
+                "   .. only:: birp or urp",
+                "",
+                "      -  BIRP and URP item",
+                "",
+                "      .. only:: not hdrp",
+                "",
+                f"         -  Nested item{value}",
+                "",
+                "   -  Last item `[BIRP] [URP]`",
+                "",
+            ]
+        else:
+            lines += [
+                ".. line_block::",
+                "",
+                f"   | Line{value}",
+                "",
+                "   .. only:: hdrp",
+                "",
+                "      | HDRP line",
+                "",
+                "      .. only:: html",
+                "",
+                f"         | Nested line{value}",
+                "",
+                "   | Last line `[[HDRP]]`",
+                "",
+            ]
+
+    for index in range(corpus["embeds"]):
+        if index % 2 == 0:
+            lines += [".. youtube:: dQw4w9WgXcQ", "", f"   Video {index} of page {page}", ""]
+        else:
+            lines += [f".. trello:: https://trello.com/c/{page:04}{index:04}", ""]
+
+    return "\n".join(lines)
+
+
+def generate_corpus(corpus, directory):
+    with open(os.path.join(directory, "conf.py"), "w", encoding="utf-8") as file:
+        file.write(CONFIG.format(extensions=EXTENSIONS_DIRECTORY, prolog=generate_prolog(corpus)))
+    with open(os.path.join(directory, "index.rst"), "w", encoding="utf-8") as file:
+        file.write("Benchmark\n=========\n\n.. toctree::\n   :glob:\n\n   page-*\n")
+    for page in range(corpus["pages"]):
+        with open(os.path.join(directory, f"page-{page:04}.rst"), "w", encoding="utf-8") as file:
+            file.write(generate_page(corpus, page))
+
+
+def get_peak_memory():
+    try:
+        import resource
+    except ImportError:
+        # Windows.
+        return None
+    peak = max(
+        resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+        # Parallel processes once they have finished.
+        resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss,
+    )
+    # Bytes on macOS, kilobytes elsewhere.
+    return peak / 1024 / 1024 if sys.platform == "darwin" else peak / 1024
+
+
+def run_build(source, output, jobs, tags):
+    # Runs in its own process so the memory is only of this build and nothing is warm.
+    from sphinx.application import Sphinx
+
+    times = {"resolve": 0}
+
+    def start_reading(app, env, docnames):
+        times["read_start"] = time.perf_counter()
+
+    def finish_reading(app, env):
+        times["read_end"] = time.perf_counter()
+
+    def start_writing(app, env):
+        # After the environment is pickled so the wrapper is not.
+        get_and_resolve_doctree = env.get_and_resolve_doctree
+
+        def timed(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return get_and_resolve_doctree(*args, **kwargs)
+            finally:
+                times["resolve"] += time.perf_counter() - start
+
+        env.get_and_resolve_doctree = timed
+
+    def finish(app, exception):
+        times["end"] = time.perf_counter()
+        app.env.__dict__.pop("get_and_resolve_doctree", None)
+
+    start = time.perf_counter()
+    app = Sphinx(
+        source,
+        source,
+        output,
+        os.path.join(output, ".doctrees"),
+        "html",
+        status=None,
+        tags=tags,
+        parallel=jobs,
+        freshenv=True,
+    )
+    app.connect("env-before-read-docs", start_reading)
+    app.connect("env-updated", finish_reading)
+    app.connect("env-check-consistency", start_writing)
+    app.connect("build-finished", finish, priority=1000)
+    setup_end = time.perf_counter()
+    app.build()
+
+    return {
+        "setup": setup_end - start,
+        "read": times["read_end"] - times["read_start"],
+        "resolve": times["resolve"],
+        "write": times["end"] - times["read_end"] - times["resolve"],
+        "total": times["end"] - start,
+        "peak_memory_mb": get_peak_memory(),
+        "warnings": app._warncount,
+    }
+
+
+def benchmark(name, source, jobs, repeat, tags):
+    runs = []
+    for _ in range(repeat):
+        output = tempfile.mkdtemp(prefix="benchmark-output-")
+        try:
+            result = subprocess.run(
+                [sys.executable, os.path.abspath(__file__), "--child", source, output, str(jobs), *tags],
+                stdout=subprocess.PIPE,
+                check=True,
+            )
+        finally:
+            shutil.rmtree(output, ignore_errors=True)
+        runs.append(json.loads(result.stdout.decode("utf-8").strip().splitlines()[-1]))
+        print(f"{name} -j {jobs}: " + ", ".join(f"{x} {runs[-1][x]:.2f}s" for x in PHASES), file=sys.stderr)
+
+    # The fastest run is the least disturbed by anything else running.
+    best = {x: min(run[x] for run in runs) for x in PHASES}
+    memory = [run["peak_memory_mb"] for run in runs if run["peak_memory_mb"] is not None]
+    best["peak_memory_mb"] = max(memory) if memory else None
+    return {"jobs": jobs, "best": best, "runs": runs}
+
+
+def get_corpora(args):
+    corpora = {"defaults": dict(DEFAULTS)}
+    for key, default in DEFAULTS.items():
+        for value in getattr(args, key) or []:
+            if value != default:
+                corpora[f"{key}={value}"] = dict(DEFAULTS, **{key: value})
+    return corpora
+
+
+def get_commit():
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "HEAD"], cwd=SOURCE_DIRECTORY, capture_output=True, text=True, check=True
+        ).stdout.strip()
+        dirty = subprocess.run(
+            ["git", "status", "--porcelain", "--", "."], cwd=SOURCE_DIRECTORY, capture_output=True, text=True
+        ).stdout.strip() != ""
+    except (OSError, subprocess.CalledProcessError):
+        return None, None
+    return commit, dirty
+
+
+def run(args):
+    import sphinx
+
+    job_counts = sorted({(os.cpu_count() or 1) if x == "auto" else int(x) for x in args.jobs})
+    commit, dirty = get_commit()
+    report = {
+        "version": FORMAT_VERSION,
+        "commit": commit,
+        "dirty": dirty,
+        "python": platform.python_version(),
+        "sphinx": sphinx.__version__,
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+        "repeat": args.repeat,
+        "results": {},
+    }
+
+    directory = tempfile.mkdtemp(prefix="benchmark-source-")
+    try:
+        for name, corpus in get_corpora(args).items():
+            source = os.path.join(directory, name.replace("=", "-"))
+            os.makedirs(source)
+            generate_corpus(corpus, source)
+            for jobs in job_counts:
+                result = benchmark(name, source, jobs, args.repeat, TAGS)
+                report["results"][f"{name} -j {jobs}"] = dict(result, corpus=corpus)
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+    if args.docs:
+        for jobs in job_counts:
+            report["results"][f"docs -j {jobs}"] = benchmark("docs", SOURCE_DIRECTORY, jobs, args.repeat, TAGS)
+
+    os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+    with open(args.output, "w", encoding="utf-8") as file:
+        json.dump(report, file, indent=2, sort_keys=True)
+        file.write("\n")
+    print(f"Results written to {args.output}", file=sys.stderr)
+
+
+def compare(before_path, after_path, threshold):
+    with open(before_path, encoding="utf-8") as file:
+        before = json.load(file)
+    with open(after_path, encoding="utf-8") as file:
+        after = json.load(file)
+    if before.get("version") != after.get("version"):
+        sys.exit(f"Cannot compare format version {before.get('version')} with {after.get('version')}")
+
+    print(f"{before.get('commit') or before_path} -> {after.get('commit') or after_path}")
+    regressions = 0
+    columns = PHASES + ("peak_memory_mb",)
+    print(f"{'':<24}" + "".join(f"{x:>18}" for x in columns))
+    for name in sorted(set(before["results"]) & set(after["results"])):
+        cells = []
+        for column in columns:
+            old = before["results"][name]["best"][column]
+            new = after["results"][name]["best"][column]
+            if not old or new is None:
+                cells.append(f"{'-':>18}")
+                continue
+            change = (new - old) / old * 100
+            # Ignore tiny phases where noise dominates.
+            regressed = change > threshold and new - old > (0.05 if column in PHASES else 5)
+            regressions += regressed
+            cells.append(f"{new:>9.2f} {change:+6.1f}%{'!' if regressed else ' '}")
+        print(f"{name:<24}" + "".join(cells))
+    for name in sorted(set(before["results"]) ^ set(after["results"])):
+        print(f"{name:<24} only in {'before' if name in before['results'] else 'after'}")
+    if regressions:
+        print(f"{regressions} regressions over {threshold}% (marked with !)")
+    return 1 if regressions else 0
+
+
+def main():
+    if len(sys.argv) > 1 and sys.argv[1] == "--child":
+        source, output, jobs, *tags = sys.argv[2:]
+        print(json.dumps(run_build(source, output, int(jobs), tags)))
+        return 0
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument("-j", dest="jobs", nargs="+", default=["1", "auto"], help="parallel job counts to build with")
+    parser.add_argument("--repeat", type=int, default=3, help="builds per corpus, the fastest is kept")
+    parser.add_argument("-o", "--output", default=OUTPUT_PATH)
+    parser.add_argument("--no-docs", dest="docs", action="store_false", help="do not build these docs as well")
+    parser.add_argument("--compare", nargs=2, metavar=("BEFORE", "AFTER"))
+    parser.add_argument("--threshold", type=float, default=10, help="percentage slower to report as a regression")
+    for key, default in DEFAULTS.items():
+        parser.add_argument(f"--{key}", type=int, nargs="+", help=f"values to try (default {default})")
+    args = parser.parse_args()
+
+    if args.compare:
+        return compare(*args.compare, args.threshold)
+    run(args)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -45,9 +45,15 @@ extensions = [
     "sponsor",
     "trello",
     "variables",
+    "includes",
     "tags",
     "links",
     "hacks",
+    "images",
+    "pipelines",
+    "search",
+    "fingerprint",
+    "compress",
 
     "notfound.extension",
 
@@ -68,6 +74,8 @@ exclude_patterns = [
     '.DS_Store',
     ".env",
     "extensions",
+    "tests",
+    ".pytest_cache",
     "**/includes",
     "README.md",
     "design-tabs.js", # We are using inline-tabs and this throws errors/warnings
@@ -79,6 +87,8 @@ if os.environ.get('PLATFORM') == "READTHEDOCS":
     tags.add("birp")
     tags.add("hdrp")
     tags.add("urp")
+    # Compressed by their CDN.
+    compress_formats = []
 else:
     notfound_no_urls_prefix = True
 
@@ -128,17 +138,30 @@ html_show_sphinx = False
 html_static_path = ["_static", "../logo"]
 
 # These paths are either relative to html_static_path or fully qualified paths (eg. https://...).
-# Increment query parameter to invalidate the cache.
+# Static files are given hashed names when the build finishes (see extensions/fingerprint.py) so caches are
+# invalidated when they change.
 html_css_files = [
     'custom.css',
 ]
 
+# Deferred so they do not block rendering. Order is kept.
 html_js_files = [
-    'https://cdnjs.cloudflare.com/ajax/libs/medium-zoom/1.0.6/medium-zoom.min.js',
-    'https://p.trellocdn.com/embed.min.js',
-    'custom.js',
+    ('https://cdnjs.cloudflare.com/ajax/libs/medium-zoom/1.0.6/medium-zoom.min.js', {"defer": "defer"}),
+    ('custom.js', {"defer": "defer"}),
 ]
 
+# -- Offline -----------------------------------------------------------------
+
+# For local or air-gapped builds: make html O="-t offline"
+# Skips the RTDs only extensions and third-party scripts, and verifies the output does not load anything from another
+# host. Embeds (eg YouTube) fall back to links.
+if tags.has("offline"):
+    extensions.remove("hoverxref.extension")
+    extensions.remove("sphinx_search.extension")
+    extensions.append("offline")
+    html_js_files = [x for x in html_js_files if not x[0].startswith("https://")]
+    html_math_renderer = "offline"
+
 # -- Options for PDF output --------------------------------------------------
 
 # Customise PDF here. maketitle overrides the cover page.
@@ -180,13 +203,13 @@ default_role = "get"
 # Versus:
 #   .. set:: Link {LinkBase}/something/{LinkPart}/example.html
 
-# The following will be included before every page:
-rst_prolog = f"""
-.. tags::
+# The following global variables are parsed once per build and are available to every page. Pages can override them
+# with their own "set" directive.
+variables_prolog = f"""
 .. set:: AssetVersion {version}
 .. set:: SponsorLink {sponsor_link}
 """
-rst_prolog = rst_prolog + """
+variables_prolog = variables_prolog + """
 .. set:: RPMinVersion 10.10
 .. set:: UPMDocLinkBase \https://docs.unity3d.com/Packages
 .. set:: RPDocLinkBase \https://docs.unity3d.com/Packages/com.unity.render-pipelines.
@@ -258,6 +281,18 @@ rst_prolog = rst_prolog + """
 
 # -- Debugging ---------------------------------------------------------------
 
+# Time directives and roles, and write a report to the output directory: make html O="-t profiling"
+if tags.has("profiling"):
+    extensions.append("profiling")
+
+# Time and memory per document for each phase, and write a report to the output directory: make html O="-t telemetry"
+if tags.has("telemetry"):
+    extensions.append("telemetry")
+
+# Check external links (including those from roles and variables) when the build finishes: make html O="-t checklinks"
+if tags.has("checklinks"):
+    extensions.append("checklinks")
+
 # For debugging if you want to always have a tag on or off
 # tags.add("tag")
 # tags.remove("tag")
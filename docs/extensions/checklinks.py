@@ -0,0 +1,233 @@
+import asyncio
+import json
+import os
+import re
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urldefrag, urlparse
+import requests
+from docutils import nodes
+from requests.adapters import HTTPAdapter
+from sphinx.util import logging
+from variables import findall
+
+# Checks the external links once the build has finished. Enable with "-t checklinks" (eg make html O="-t checklinks").
+# Unlike the linkcheck builder, it checks the links as they are in the doctrees so links built by roles and variables
+# (eg :link:, :branch: and DocLink variables) are included. Each URL is checked once however many times it is used.
+# Requests run concurrently with a limit overall and per host, and results are cached on disk until they expire.
+#
+# The checker can be run on its own (eg against a local server): python checklinks.py URL [URL ...]
+
+logger = logging.getLogger(__name__)
+
+# Servers which do not support HEAD.
+HEAD_UNSUPPORTED = {403, 405, 501}
+
+
+class HostLimiter:
+    # Limits the concurrent requests to a host and how often they start.
+    def __init__(self, concurrency, rate):
+        self.semaphore = asyncio.Semaphore(concurrency)
+        self.interval = 1 / rate
+        self.next_time = 0
+
+    def delay(self, seconds):
+        self.next_time = max(self.next_time, time.monotonic() + seconds)
+
+    async def __aenter__(self):
+        await self.semaphore.acquire()
+        now = time.monotonic()
+        wait = self.next_time - now
+        self.next_time = max(now, self.next_time) + self.interval
+        if wait > 0:
+            await asyncio.sleep(wait)
+
+    async def __aexit__(self, *args):
+        self.semaphore.release()
+
+
+def fetch(session, url, timeout):
+    try:
+        response = session.head(url, allow_redirects=True, timeout=timeout)
+        if response.status_code in HEAD_UNSUPPORTED:
+            response = session.get(url, allow_redirects=True, timeout=timeout, stream=True)
+            response.close()
+    except requests.RequestException as error:
+        return {"status": "broken", "code": 0, "message": str(error)}
+
+    result = {"code": response.status_code, "message": response.reason or ""}
+    if response.status_code == 429:
+        retry_after = response.headers.get("Retry-After", "")
+        result.update(status="rate-limited", retry_after=int(retry_after) if retry_after.isdigit() else 10)
+    elif not response.ok:
+        result.update(status="broken")
+    elif response.history and urldefrag(response.url)[0] != url:
+        result.update(status="redirected", message=response.url)
+    else:
+        result.update(status="working")
+    return result
+
+
+async def check_all(urls, workers=16, host_workers=2, host_rate=5, timeout=10, retries=2):
+    pool = asyncio.Semaphore(workers)
+    hosts = {}
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=workers, pool_maxsize=host_workers)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+
+    async def check(url):
+        limiter = hosts.setdefault(urlparse(url).netloc, HostLimiter(host_workers, host_rate))
+        for _ in range(retries + 1):
+            # Wait for the host first so a busy host does not hold slots in the pool.
+            async with limiter, pool:
+                result = await asyncio.to_thread(fetch, session, url, timeout)
+            if result["status"] != "rate-limited":
+                break
+            limiter.delay(min(result["retry_after"], 60))
+        return url, result
+
+    try:
+        return dict(await asyncio.gather(*(check(url) for url in urls)))
+    finally:
+        session.close()
+
+
+def run(coroutine):
+    # asyncio.run cannot be used from a running event loop (eg live.py builds from livereload's), so it is run in a
+    # thread with its own.
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        return asyncio.run(coroutine)
+    with ThreadPoolExecutor(1) as executor:
+        return executor.submit(asyncio.run, coroutine).result()
+
+
+def check_urls(urls, cache_path=None, ttl=86400, **options):
+    # Returns a result per URL. Results are cached when given a path.
+    cache = {}
+    if cache_path is not None and os.path.exists(cache_path):
+        with open(cache_path, encoding="utf-8") as file:
+            cache = json.load(file)
+
+    now = time.time()
+    results = {url: cache[url] for url in urls if url in cache and now - cache[url]["checked"] < ttl}
+    for url, result in run(check_all([url for url in urls if url not in results], **options)).items():
+        result["checked"] = now
+        results[url] = result
+        # Connection errors and rate limiting could be fine next time.
+        if result["code"] not in (0, 429):
+            cache[url] = result
+
+    if cache_path is not None:
+        # Expired entries are dropped when they are not used anymore.
+        cache = {url: result for url, result in cache.items() if now - result["checked"] < ttl}
+        temporary_path = f"{cache_path}.{os.getpid()}.tmp"
+        with open(temporary_path, "w", encoding="utf-8") as file:
+            json.dump(cache, file, indent=2, sort_keys=True)
+        os.replace(temporary_path, cache_path)
+    return results
+
+
+def get_line(node):
+    while node is not None:
+        if node.line is not None:
+            return node.line
+        node = node.parent
+    return None
+
+
+def collect_links(app, doctree):
+    # Collected when reading so they are kept with the environment and only changed documents are walked.
+    links = {}
+    for node, location in findall(app.env, doctree, nodes.reference):
+        uri = node.get("refuri", "")
+        if uri.startswith(("http://", "https://")):
+            links.setdefault(urldefrag(uri)[0], []).append(get_line(location))
+    app.env.external_links[app.env.docname] = links
+
+
+def init_links(app):
+    if not hasattr(app.env, "external_links"):
+        app.env.external_links = {}
+
+
+def purge_links(app, env, docname):
+    if hasattr(env, "external_links"):
+        env.external_links.pop(docname, None)
+
+
+def merge_links(app, env, docnames, other):
+    for docname in docnames:
+        if docname in other.external_links:
+            env.external_links[docname] = other.external_links[docname]
+
+
+def check_links(app, exception):
+    if exception is not None:
+        return
+
+    ignore = [re.compile(pattern) for pattern in app.config.checklinks_ignore]
+    usages = {}
+    for docname, links in sorted(app.env.external_links.items()):
+        for url, lines in links.items():
+            if not any(pattern.match(url) for pattern in ignore):
+                usages.setdefault(url, []).extend((docname, line) for line in lines)
+
+    logger.info(f"checking {len(usages)} external links...")
+    os.makedirs(app.doctreedir, exist_ok=True)
+    results = check_urls(
+        sorted(usages),
+        cache_path=os.path.join(app.doctreedir, "checklinks.json"),
+        ttl=app.config.checklinks_ttl,
+        workers=app.config.checklinks_workers,
+        host_workers=app.config.checklinks_host_workers,
+        host_rate=app.config.checklinks_host_rate,
+        timeout=app.config.checklinks_timeout,
+    )
+
+    counts = {}
+    for url, result in results.items():
+        counts[result["status"]] = counts.get(result["status"], 0) + 1
+        if result["status"] in ("broken", "rate-limited"):
+            for docname, line in usages[url]:
+                logger.warning(
+                    f"{result['status']} link: {url} ({result['code']} {result['message']})",
+                    location=(docname, line),
+                )
+
+    path = os.path.join(app.outdir, app.config.checklinks_report)
+    with open(path, "w", encoding="utf-8") as file:
+        report = {url: dict(result, usages=usages[url]) for url, result in results.items()}
+        json.dump(report, file, indent=2, sort_keys=True)
+    logger.info(", ".join(f"{count} {status}" for status, count in sorted(counts.items())) or "no external links")
+    logger.info(f"Full report written to {path}")
+
+
+def setup(app):
+    app.setup_extension("variables")
+    app.add_config_value("checklinks_ignore", [r"https?://localhost", r"https?://127\.0\.0\.1"], "")
+    # Seconds until a result is checked again.
+    app.add_config_value("checklinks_ttl", 24 * 60 * 60, "")
+    app.add_config_value("checklinks_workers", 16, "")
+    app.add_config_value("checklinks_host_workers", 2, "")
+    # Requests per second.
+    app.add_config_value("checklinks_host_rate", 5, "")
+    app.add_config_value("checklinks_timeout", 10, "")
+    app.add_config_value("checklinks_report", "links.json", "")
+    app.connect("builder-inited", init_links)
+    app.connect("doctree-read", collect_links)
+    app.connect("env-purge-doc", purge_links)
+    app.connect("env-merge-info", merge_links)
+    app.connect("build-finished", check_links)
+    return {
+        'parallel_read_safe': True,
+        'parallel_write_safe': True,
+    }
+
+
+if __name__ == "__main__":
+    for url, result in check_urls(sys.argv[1:]).items():
+        print(f"{result['status']:<12} {result['code']:>3} {url} {result['message']}")
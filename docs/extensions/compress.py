@@ -0,0 +1,200 @@
+import gzip
+import hashlib
+import json
+import os
+import time
+import brotli
+import minify_html
+import rcssmin
+import rjsmin
+from fingerprint import get_original
+from sphinx.errors import ConfigError
+from sphinx.util import logging
+
+# Minifies the HTML, CSS and JavaScript in the output once the build has finished, and writes gzip and Brotli
+# compressed copies next to the text files (eg index.html.gz and index.html.br) for servers which serve them as is
+# (eg serve.py, or nginx with gzip_static and brotli_static).
+#
+# Files are only processed again if their content changed since, which is tracked in the doctrees directory (files
+# copied again with the same content, eg by extensions on every build, are skipped). Only the pages and the fingerprinted
+# copies in _static are minified. Sphinx and extensions (eg _sphinx_design_static) copy the other static files again
+# whenever they differ from the source, so minifying them would mean copying and processing them on every build.
+
+logger = logging.getLogger(__name__)
+
+MINIFIERS = {
+    ".html": lambda text: minify_html.minify(
+        text,
+        minify_css=True,
+        minify_js=True,
+        # Keep the markup complete for anything parsing the pages which is not a browser.
+        keep_closing_tags=True,
+        keep_html_and_head_opening_tags=True,
+    ),
+    ".css": rcssmin.cssmin,
+    ".js": rjsmin.jsmin,
+}
+
+COMPRESSORS = {
+    "gzip": (".gz", lambda data, config: gzip.compress(data, compresslevel=9, mtime=0)),
+    "br": (".br", lambda data, config: brotli.compress(data, quality=config.compress_brotli_quality)),
+}
+
+# Smaller files are not worth it as the headers are a similar size.
+MINIMUM_SIZE = 1024
+
+
+def is_minified(name):
+    return ".min." in name
+
+
+def get_compressed_paths(path, size, formats):
+    # Those process writes for the file.
+    return [path + COMPRESSORS[x][0] for x in formats] if size >= MINIMUM_SIZE else []
+
+
+def get_digest(data):
+    return hashlib.sha1(data).hexdigest()
+
+
+def process(path, minify, formats, config, report):
+    ext = os.path.splitext(path)[1]
+    with open(path, "rb") as file:
+        data = file.read()
+    report["original"] += len(data)
+
+    if minify and not is_minified(os.path.basename(path)):
+        minified = MINIFIERS[ext](data.decode("utf-8")).encode("utf-8")
+        if len(minified) < len(data):
+            data = minified
+            with open(path, "wb") as file:
+                file.write(data)
+    report["minified"] += len(data)
+
+    for format in formats:
+        suffix, compress = COMPRESSORS[format]
+        if len(data) < MINIMUM_SIZE:
+            if os.path.exists(path + suffix):
+                os.remove(path + suffix)
+            # Counted as is since that is what is sent.
+            report[format] += len(data)
+            continue
+        compressed = compress(data, config)
+        with open(path + suffix, "wb") as file:
+            file.write(compressed)
+        report[format] += len(compressed)
+    return data
+
+
+def compress_output(app, exception):
+    if exception is not None or app.builder.format != "html":
+        return
+
+    start = time.perf_counter()
+    extensions = set(app.config.compress_extensions)
+    suffixes = tuple(COMPRESSORS[x][0] for x in COMPRESSORS)
+    state_path = os.path.join(app.doctreedir, "compress.json")
+    state = {}
+    if os.path.exists(state_path):
+        with open(state_path, encoding="utf-8") as file:
+            state = json.load(file)
+    # Everything is processed again when the settings change.
+    settings = [
+        sorted(extensions),
+        app.config.compress_formats,
+        app.config.compress_minify,
+        app.config.compress_brotli_quality,
+    ]
+    if state.get("settings") != settings:
+        state = {}
+
+    report = {"files": 0, "removed": 0, "original": 0, "minified": 0, **{x: 0 for x in COMPRESSORS}}
+    static_directory = os.path.join(app.outdir, "_static")
+    files = {}
+    compressed_paths = set()
+    expected_paths = set()
+    for root, directories, file_names in os.walk(app.outdir):
+        directories[:] = [x for x in directories if not x.startswith(".")]
+        for file_name in file_names:
+            path = os.path.join(root, file_name)
+            if file_name.startswith("."):
+                continue
+            if file_name.endswith(suffixes):
+                compressed_paths.add(path)
+                continue
+            ext = os.path.splitext(file_name)[1]
+            minify = app.config.compress_minify and ext in MINIFIERS
+            if path.startswith(static_directory + os.sep):
+                name = os.path.relpath(path, static_directory).replace(os.sep, "/")
+                minify = minify and get_original(static_directory, name) != name
+            else:
+                minify = minify and ext == ".html"
+            if ext not in extensions and not minify:
+                continue
+            name = os.path.relpath(path, app.outdir).replace(os.sep, "/")
+            stat = os.stat(path)
+            # Size, modification time and the hash of the content after processing.
+            entry = state.get("files", {}).get(name, [])
+            digest = entry[2] if len(entry) == 3 else None
+            formats = app.config.compress_formats if ext in extensions else []
+            # Compressed copies can be removed without the file changing (eg search.py writes _search again).
+            missing = not all(os.path.exists(x) for x in get_compressed_paths(path, stat.st_size, formats))
+            if missing or entry[:2] != [stat.st_size, stat.st_mtime_ns]:
+                with open(path, "rb") as file:
+                    data = file.read()
+                if missing or get_digest(data) != digest:
+                    digest = get_digest(process(path, minify, formats, app.config, report))
+                    report["files"] += 1
+                    stat = os.stat(path)
+            files[name] = [stat.st_size, stat.st_mtime_ns, digest]
+            expected_paths.update(get_compressed_paths(path, stat.st_size, formats))
+
+    # Those of files which were removed (eg the previous fingerprinted copy of custom.css) or formats no longer used, so
+    # they are not published either.
+    for path in compressed_paths - expected_paths:
+        if os.path.splitext(os.path.splitext(path)[0])[1] in extensions:
+            os.remove(path)
+            report["removed"] += 1
+
+    os.makedirs(app.doctreedir, exist_ok=True)
+    with open(state_path, "w", encoding="utf-8") as file:
+        json.dump({"settings": settings, "files": files}, file)
+
+    if report["files"] == 0 and report["removed"] == 0:
+        logger.info("compressed output: nothing changed")
+        return
+    logger.info(
+        f"compressed output: {report['files']} files processed and {report['removed']} stale compressed copies removed "
+        f"in {time.perf_counter() - start:.1f}s, "
+        f"{report['original'] / 1024:.0f} KB -> {report['minified'] / 1024:.0f} KB minified"
+        + "".join(f", {report[x] / 1024:.0f} KB {x}" for x in app.config.compress_formats)
+    )
+
+
+def check_formats(app, config):
+    # Empty entries are ignored so compression can be turned off with -D compress_formats= (which gives [""]).
+    config.compress_formats = [x for x in config.compress_formats if x]
+    for format in config.compress_formats:
+        if format not in COMPRESSORS:
+            raise ConfigError(f"Unknown compress_formats entry: {format} (supported: {', '.join(COMPRESSORS)})")
+
+
+def setup(app):
+    app.setup_extension("fingerprint")
+    # Set to a false value to only compress.
+    app.add_config_value("compress_minify", True, "html")
+    # Set to an empty list to only minify.
+    app.add_config_value("compress_formats", ["gzip", "br"], "html")
+    # 11 is under 1% smaller but takes more than twice as long.
+    app.add_config_value("compress_brotli_quality", 10, "html")
+    # Which files get compressed copies. Images and fonts are already compressed.
+    app.add_config_value(
+        "compress_extensions", [".html", ".css", ".js", ".json", ".svg", ".txt", ".xml"], "html"
+    )
+    app.connect("config-inited", check_formats)
+    # After fingerprint.py has updated the pages, but before its publish manifest.
+    app.connect("build-finished", compress_output, priority=920)
+    return {
+        'parallel_read_safe': True,
+        'parallel_write_safe': True,
+    }
@@ -0,0 +1,164 @@
+import hashlib
+import json
+import os
+import re
+import shutil
+import time
+from sphinx.util import logging
+
+# Gives the static files (eg custom.css and the logos) names with a hash of their content once the build has finished
+# (eg custom.1a2b3c4d5e.css), and points the pages at them. A changed file gets a new name so they can be cached
+# forever, which is written to a _headers file for hosts which support it (eg Netlify and Cloudflare Pages).
+#
+# Every page is updated, not only those written, as a static file can change without its pages being written again.
+# The originals are kept for anything which references them without going through a page (eg relative URLs in CSS).
+#
+# A manifest of the output is kept next to the doctrees with the files added or changed by the last build and those
+# removed, so publishing can transfer only those.
+
+logger = logging.getLogger(__name__)
+
+HASH_LENGTH = 10
+
+# References to static files in the pages, with the query Sphinx adds for cache busting.
+# Attribute values may be unquoted once minified (see compress.py).
+STATIC_PATTERN = re.compile(r"""(?<=["'/=])_static/([^"'?#\s<>]+)(?:\?v=[0-9a-f]+)?""")
+FINGERPRINT_PATTERN = re.compile(rf"^(.*)\.[0-9a-f]{{{HASH_LENGTH}}}(\.[^./]+)$")
+
+IMMUTABLE = "public, max-age=31536000, immutable"
+
+
+def get_digest(path):
+    with open(path, "rb") as file:
+        return hashlib.sha1(file.read()).hexdigest()
+
+
+def get_original(static_directory, name):
+    # Pages which have not been written again still point at the previous fingerprinted name.
+    match = FINGERPRINT_PATTERN.match(name)
+    if match and os.path.isfile(os.path.join(static_directory, match[1] + match[2])):
+        return match[1] + match[2]
+    return name
+
+
+def fingerprint_pages(outdir):
+    static_directory = os.path.join(outdir, "_static")
+    names = {}
+
+    def get_name(name):
+        original = get_original(static_directory, name)
+        if original not in names:
+            path = os.path.join(static_directory, original)
+            if not os.path.isfile(path):
+                names[original] = None
+            else:
+                root, ext = os.path.splitext(original)
+                names[original] = f"{root}.{get_digest(path)[:HASH_LENGTH]}{ext}"
+                destination = os.path.join(static_directory, names[original])
+                if not os.path.exists(destination):
+                    shutil.copy2(path, destination)
+        return names[original]
+
+    def replace(match):
+        name = get_name(match[1])
+        return match[0] if name is None else f"_static/{name}"
+
+    updated = 0
+    for root, directories, files in os.walk(outdir):
+        directories[:] = [x for x in directories if not x.startswith(".") and x != "_static"]
+        for file_name in files:
+            if not file_name.endswith(".html"):
+                continue
+            path = os.path.join(root, file_name)
+            with open(path, encoding="utf-8") as file:
+                content = file.read()
+            replaced = STATIC_PATTERN.sub(replace, content)
+            if replaced != content:
+                with open(path, "w", encoding="utf-8") as file:
+                    file.write(replaced)
+                updated += 1
+
+    # Remove those left over from previous builds.
+    fingerprinted = {name for name in names.values() if name is not None}
+    for root, _, files in os.walk(static_directory):
+        for file_name in files:
+            name = os.path.relpath(os.path.join(root, file_name), static_directory).replace(os.sep, "/")
+            if name not in fingerprinted and get_original(static_directory, name) != name:
+                os.remove(os.path.join(root, file_name))
+
+    return sorted(fingerprinted), updated
+
+
+def write_headers(outdir, file_name, fingerprinted):
+    with open(os.path.join(outdir, file_name), "w", encoding="utf-8") as file:
+        for name in fingerprinted:
+            file.write(f"/_static/{name}\n  Cache-Control: {IMMUTABLE}\n")
+
+
+def update_manifest(outdir, path):
+    # The hash of a file is only computed again if its size or modification time changed.
+    previous = {}
+    if os.path.exists(path):
+        with open(path, encoding="utf-8") as file:
+            previous = json.load(file)["files"]
+
+    files = {}
+    for root, directories, file_names in os.walk(outdir):
+        directories[:] = [x for x in directories if not x.startswith(".")]
+        for file_name in file_names:
+            if file_name.startswith("."):
+                continue
+            file_path = os.path.join(root, file_name)
+            name = os.path.relpath(file_path, outdir).replace(os.sep, "/")
+            stat = os.stat(file_path)
+            entry = previous.get(name)
+            if entry is None or entry["size"] != stat.st_size or entry["mtime"] != stat.st_mtime_ns:
+                entry = {"digest": get_digest(file_path), "size": stat.st_size, "mtime": stat.st_mtime_ns}
+            files[name] = entry
+
+    changed = [x for x in sorted(files) if x not in previous or previous[x]["digest"] != files[x]["digest"]]
+    removed = sorted(set(previous) - set(files))
+    temporary_path = f"{path}.{os.getpid()}.tmp"
+    with open(temporary_path, "w", encoding="utf-8") as file:
+        json.dump({"changed": changed, "removed": removed, "files": files}, file, indent=1, sort_keys=True)
+    os.replace(temporary_path, path)
+    return changed, removed
+
+
+def fingerprint(app, exception):
+    if exception is not None or app.builder.format != "html":
+        return
+
+    start = time.perf_counter()
+    fingerprinted, updated = fingerprint_pages(app.outdir)
+    if app.config.fingerprint_headers:
+        write_headers(app.outdir, app.config.fingerprint_headers, fingerprinted)
+    logger.info(
+        f"fingerprinted {len(fingerprinted)} static files and updated {updated} pages "
+        f"in {(time.perf_counter() - start) * 1000:.0f} ms"
+    )
+
+
+def write_manifest(app, exception):
+    if exception is not None or app.builder.format != "html" or not app.config.fingerprint_manifest:
+        return
+
+    os.makedirs(app.doctreedir, exist_ok=True)
+    path = os.path.join(app.doctreedir, app.config.fingerprint_manifest)
+    changed, removed = update_manifest(app.outdir, path)
+    logger.info(f"publish manifest: {len(changed)} files added or changed, {len(removed)} removed ({path})")
+
+
+def setup(app):
+    # Relative to the output directory. Empty to not write it.
+    app.add_config_value("fingerprint_headers", "_headers", "html")
+    # Relative to the doctrees directory. Empty to not write it.
+    app.add_config_value("fingerprint_manifest", "publish.json", "html")
+    # After everything else which writes to the output directory (eg search.py), and the manifest last of all (eg
+    # after compress.py).
+    app.connect("build-finished", fingerprint, priority=900)
+    app.connect("build-finished", write_manifest, priority=990)
+    return {
+        'parallel_read_safe': True,
+        'parallel_write_safe': True,
+    }
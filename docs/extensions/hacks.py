@@ -1,5 +1,8 @@
 from docutils import nodes
+from sphinx import addnodes
+from sphinx.transforms.post_transforms import SphinxPostTransform
 from sphinx.util.docutils import SphinxDirective
+from tags import eval_condition
 
 # These directives get around the issue where the "only" directive breaks blocks like lists or line blocks.
 #
@@ -19,35 +22,68 @@ from sphinx.util.docutils import SphinxDirective
 class Block(SphinxDirective):
     has_content = True
     def run(self):
-        block_type = self.name
         container = nodes.container()
         self.state.nested_parse(self.content, self.content_offset, container)
-        # Calling a method by string.
-        block_node = getattr(nodes, block_type)()
-        for node in container:
-            node_copy = node
-            if node_copy.asdom().tagName == "comment":
+        # Getting a class by string.
+        block_type = getattr(nodes, self.name)
+        block_node = block_type()
+        items = []
+        self.flatten(container.children, block_type, items)
+        block_node += items
+        return [block_node]
+
+    def flatten(self, node_list, block_type, items, expr=None):
+        for node in node_list:
+            if isinstance(node, nodes.comment):
+                continue
+            if isinstance(node, addnodes.only):
+                inner_expr = node["expr"] if expr is None else f"({expr}) and ({node['expr']})"
+                # Indentation will make a sublist so we need to flatten it. These can be nested.
+                self.flatten(node.children, block_type, items, inner_expr)
                 continue
-            if node_copy.asdom().tagName == "only":
-                if not self.env.app.tags.eval_condition(node_copy.attributes["expr"]):
-                    continue
-                node_copy = []
-                # We need to flatten the list by one level since indentation will make a sublist.
-                # This sort of thing probably should be recursive.
-                for inner_node in node:
-                    if inner_node.asdom().tagName == "comment":
-                        continue
-                    if inner_node.asdom().tagName == block_type:
-                        node_copy +=  inner_node
-                        continue
-                    # Assign block level nodes to whichever block type we found. This doesn't appear to be robust but I
-                    # think it works as it should.
-                    node_copy[-1] += inner_node
-            # Copy elements over.
-            block_node += node_copy[:]
+            # The condition is left for BlockOnly to evaluate so the doctree is the same for every builder and tag.
+            if not isinstance(node, block_type):
+                # Assign block level nodes to whichever block type we found. This doesn't appear to be robust but I
+                # think it works as it should.
+                if not items:
+                    raise self.error(f"The {self.name} directive must start with an item, not a {node.tagname} "
+                                     f"(line {node.line or self.lineno}).")
+                if expr is not None:
+                    node["block_only"] = expr
+                items[-1] += node
+                continue
+            for item in node.children:
+                if expr is not None:
+                    item["block_only"] = expr
+            items += node.children
+
+
+class BlockOnly(SphinxPostTransform):
+    # Before OnlyNodeTransform as that one leaves comment nodes behind.
+    default_priority = 40
+
+    def run(self):
+        for node in list(self.document.findall(lambda node: isinstance(node, nodes.Element) and "block_only" in node)):
+            if eval_condition(self.app, node["block_only"]):
+                del node["block_only"]
+            else:
+                node.parent.remove(node)
+
+
+# Sphinx (before 7.3) pickles the doctrees it has loaded with the environment, so a document which is read again is still
+# the old one when a builder loads it in a later build (eg the LaTeX builder putting the pages together for
+# "make pdf-write-hdrp" after "make pdf-read").
+def purge_doctree(app, env, docname):
+    env._pickled_doctree_cache.pop(docname, None)
 
-        return [block_node]
 
 def setup(app):
+    app.setup_extension("tags")
     app.add_directive("line_block", Block)
     app.add_directive("bullet_list", Block)
+    app.add_post_transform(BlockOnly)
+    app.connect("env-purge-doc", purge_doctree)
+    return {
+        'parallel_read_safe': True,
+        'parallel_write_safe': True,
+    }
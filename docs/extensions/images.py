@@ -0,0 +1,218 @@
+import hashlib
+import io
+import os
+import posixpath
+import urllib.parse
+from docutils import nodes
+from PIL import Image, features
+from sphinx.transforms.post_transforms import SphinxPostTransform
+from sphinx.util import logging
+from sphinx.writers.html5 import HTML5Translator
+
+# Generates smaller variants of local raster images when writing:
+#   HTML:  WebP and AVIF at several widths, offered with <picture> and srcset. The original stays as the fallback.
+#   LaTeX: a downscaled and recompressed PNG or JPEG which replaces the original, if it is smaller.
+# Variants are cached by a hash of the source and settings so unchanged images are never processed again. The cache
+# lives next to the doctrees so the PDF pipelines share it.
+
+logger = logging.getLogger(__name__)
+
+RASTER_EXTENSIONS = (".png", ".jpg", ".jpeg")
+
+HTML_FORMATS = {
+    "avif": ("image/avif", {"quality": 60}),
+    "webp": ("image/webp", {"quality": 80, "method": 4}),
+}
+
+LATEX_FORMATS = {
+    "PNG": {"optimize": True},
+    "JPEG": {"quality": 85, "optimize": True, "progressive": True},
+}
+
+
+def init_images(app, env, docnames):
+    # Per build so the report only covers this build and changed images are picked up by a warm server (live.py).
+    app.builder.optimized_images = {}
+    app.builder.optimized_images_report = {"processed": 0, "cached": 0, "original": 0, "optimized": 0}
+    os.makedirs(os.path.join(app.doctreedir, "images"), exist_ok=True)
+
+
+def get_source_digest(path):
+    with open(path, "rb") as file:
+        return hashlib.sha1(file.read()).hexdigest()
+
+
+def encode(image, width, format, options):
+    options = dict(options)
+    if "dpi" in image.info:
+        # Keep the physical size as LaTeX uses it for the natural size of the image.
+        options["dpi"] = tuple(x * width / image.width for x in image.info["dpi"])
+    if image.width > width:
+        image = image.resize((width, round(image.height * width / image.width)), Image.LANCZOS)
+    buffer = io.BytesIO()
+    image.save(buffer, format, **options)
+    return buffer.getvalue()
+
+
+def get_variant(app, source_digest, settings, ext, create):
+    # Returns the cached variant, or creates it. Written atomically as PDF pipelines may be written in parallel.
+    report = app.builder.optimized_images_report
+    digest = hashlib.sha1(f"{source_digest}{settings!r}".encode()).hexdigest()
+    cache_path = os.path.join(app.doctreedir, "images", f"{digest}.{ext}")
+    if os.path.exists(cache_path):
+        report["cached"] += 1
+        return cache_path
+    data = create()
+    temporary_path = f"{cache_path}.{os.getpid()}.tmp"
+    with open(temporary_path, "wb") as file:
+        file.write(data)
+    os.replace(temporary_path, cache_path)
+    report["processed"] += 1
+    return cache_path
+
+
+def html_variants(app, path):
+    source_digest = get_source_digest(path)
+    sources = []
+    # Only the header is read until the pixels are needed (ie nothing is cached).
+    with Image.open(path) as image:
+        if image.mode not in ("RGB", "RGBA"):
+            image = image.convert("RGBA" if "transparency" in image.info or "A" in image.mode else "RGB")
+        widths = sorted({width for width in app.config.images_widths if width < image.width} | {image.width})
+        for ext in app.config.images_formats:
+            mimetype, options = HTML_FORMATS[ext]
+            candidates = [
+                (get_variant(app, source_digest, (ext, width, options), ext,
+                             lambda: encode(image, width, ext.upper(), options)), width)
+                for width in widths
+            ]
+            # Not worth offering if it is bigger than the original.
+            if os.path.getsize(candidates[-1][0]) < os.path.getsize(path):
+                sources.append((mimetype, candidates))
+    return sources
+
+
+def latex_variant(app, path):
+    source_digest = get_source_digest(path)
+    with Image.open(path) as image:
+        format = "JPEG" if image.format == "JPEG" else "PNG"
+        options = LATEX_FORMATS[format]
+        width = min(image.width, app.config.images_latex_max_width)
+        ext = "jpg" if format == "JPEG" else "png"
+        variant = get_variant(app, source_digest, (format, width, options), ext,
+                              lambda: encode(image, width, format, options))
+    # Recompressing does not always help (eg small or already optimized images).
+    if os.path.getsize(variant) >= os.path.getsize(path):
+        return None
+    return variant
+
+
+def register(app, path, variant):
+    # Copied to the output along with the other images. Keys are joined to the source directory so can be absolute.
+    stem = os.path.splitext(os.path.basename(path))[0]
+    name = os.path.basename(variant)
+    app.builder.images[variant] = f"{stem}-{name[:8]}{name[40:]}"
+
+
+class OptimizeImages(SphinxPostTransform):
+    default_priority = 200
+    formats = ("html", "latex")
+
+    def run(self):
+        if not hasattr(self.app.builder, "optimized_images"):
+            return
+
+        cache = self.app.builder.optimized_images
+        report = self.app.builder.optimized_images_report
+        for node in self.document.findall(nodes.image):
+            uri = node["uri"]
+            if uri not in self.env.images or not uri.lower().endswith(RASTER_EXTENSIONS):
+                continue
+            path = os.path.join(self.app.srcdir, uri)
+
+            if uri not in cache:
+                try:
+                    if self.app.builder.format == "html":
+                        result = html_variants(self.app, path)
+                        best = min(os.path.getsize(candidates[-1][0]) for _, candidates in result) if result else None
+                    else:
+                        result = latex_variant(self.app, path)
+                        best = os.path.getsize(result) if result else None
+                except OSError as error:
+                    logger.warning("cannot optimize image %s: %s", uri, error, location=node)
+                    result, best = None, None
+                cache[uri] = result
+                if best is not None:
+                    report["original"] += os.path.getsize(path)
+                    report["optimized"] += best
+
+            result = cache[uri]
+            if not result:
+                continue
+            if self.app.builder.format == "html":
+                for _, candidates in result:
+                    for variant, _ in candidates:
+                        register(self.app, path, variant)
+                node["sources"] = result
+            else:
+                register(self.app, path, result)
+                node["uri"] = result
+                # Not in env.images so the builder leaves it alone.
+                node["candidates"] = {"*": result}
+
+
+def html_visit_image(self, node):
+    HTML5Translator.visit_image(self, node)
+    if "sources" not in node:
+        return
+
+    sources = []
+    for mimetype, candidates in node["sources"]:
+        srcset = ", ".join(
+            f"{posixpath.join(self.builder.imgpath, urllib.parse.quote(self.builder.images[variant]))} {width}w"
+            for variant, width in candidates
+        )
+        sources.append(f'<source type="{mimetype}" srcset="{srcset}" sizes="{self.config.images_sizes}" />')
+    # The image tag was the last thing written. Keep its suffix (eg a newline) outside of the picture.
+    tag = self.body[-1]
+    stripped = tag.rstrip()
+    self.body[-1] = f"<picture>{''.join(sources)}{stripped}</picture>{tag[len(stripped):]}"
+
+
+def html_depart_image(self, node):
+    HTML5Translator.depart_image(self, node)
+
+
+def write_report(app, exception):
+    if exception is not None or not hasattr(app.builder, "optimized_images_report"):
+        return
+    report = app.builder.optimized_images_report
+    saved = report["original"] - report["optimized"]
+    logger.info(
+        f"optimized images: {report['processed']} variants created, {report['cached']} from cache, "
+        f"{saved / 1024:.0f} KB saved ({report['original'] / 1024:.0f} KB to {report['optimized'] / 1024:.0f} KB)"
+    )
+
+
+def check_formats(app, config):
+    for ext in list(config.images_formats):
+        if not features.check(ext):
+            logger.warning(f"images: Pillow was built without {ext} support so it will be skipped")
+            config.images_formats.remove(ext)
+
+
+def setup(app):
+    app.add_config_value("images_formats", ["avif", "webp"], "html")
+    # Widths wider than the image are skipped. The original width is always included.
+    app.add_config_value("images_widths", [480, 960, 1440], "html")
+    app.add_config_value("images_sizes", "(max-width: 46em) 100vw, 46em", "html")
+    app.add_config_value("images_latex_max_width", 1600, "latex")
+    app.add_node(nodes.image, override=True, html=(html_visit_image, html_depart_image))
+    app.add_post_transform(OptimizeImages)
+    app.connect("config-inited", check_formats)
+    app.connect("env-before-read-docs", init_images)
+    app.connect("build-finished", write_report)
+    return {
+        'parallel_read_safe': True,
+        'parallel_write_safe': True,
+    }
@@ -0,0 +1,219 @@
+import hashlib
+import os
+import re
+from docutils import nodes
+from docutils.statemachine import StringList, string2lines
+from sphinx import addnodes
+from sphinx.directives.other import Include
+from sphinx.util import logging
+from sphinx.util.docutils import switch_source_input
+from variables import VariableRecorder, get_dictionary, get_hash
+
+# Parses each included fragment once and hands out copies of the nodes every other time it is included (eg the same
+# fragment in each pipeline tab, or on several pages). The standard include directive inserts the text into the
+# including document so it is parsed again every time.
+#
+# The nodes of a fragment depend on its content, the tags and the variables it reads which can be set by the including
+# document (eg RPNameShort from _urp-vars.rst). The variables read are recorded with their values when it is parsed and
+# compared with the current ones when it is included again. Several variants are kept for fragments included with
+# different values. Variables set by a fragment are set again when it is used from the cache.
+#
+# The cache is kept in memory for the process (eg between builds with live.py) and checked against the modification
+# time of the file, then its hash if that changed. Fragments with anything which registers with the document (eg
+# sections, targets and footnotes), or include options, use the standard directive.
+#
+# Cross-references (eg :doc:`target`) are resolved relative to the document they are in, so the copies are given the
+# including document. Fragments with anything else which names the document they were parsed in (eg a toctree) use the
+# standard directive as well.
+
+logger = logging.getLogger(__name__)
+
+# Per fragment, for different values of the variables it reads.
+MAXIMUM_VARIANTS = 8
+
+# Titles (and transitions), targets, footnotes, citations, substitution definitions and nested includes.
+UNCACHEABLE_PATTERN = re.compile(
+    r"""^(?:([!-/:-@\[-`{-~])\1{2,}\s*$|\s*\.\.\s+(?:_|\[|\||include::)|\s*__\s)""",
+    re.MULTILINE,
+)
+
+# Keyed by path and tags.
+cache = {}
+
+
+class CacheEntry:
+    def __init__(self, stat, digest, lines, cacheable):
+        self.stat = stat
+        self.digest = digest
+        self.lines = lines
+        self.cacheable = cacheable
+        self.variants = []
+
+
+class CacheVariant:
+    def __init__(self, docname, reads, writes, node_list):
+        self.docname = docname
+        self.reads = {key: get_hash(value) for key, value in reads.items()}
+        self.writes = {key: detach(value.deepcopy()) for key, value in writes.items()}
+        self.node_list = [detach(node.deepcopy()) for node in node_list]
+
+
+def detach(node):
+    # Copies keep a reference to the document they were copied from, which would keep it alive and be pickled with the
+    # doctree of the including document. Without one they use the document of their parent.
+    for child in node.findall():
+        child._document = None
+    return node
+
+
+def get_stats(env):
+    if not hasattr(env, "include_cache_stats"):
+        env.include_cache_stats = {}
+    return env.include_cache_stats.setdefault(env.docname, {"hits": 0, "misses": 0, "skipped": 0})
+
+
+class CachedInclude(Include):
+    def run(self):
+        # Options change what is included and how, and include-read listeners can change the text.
+        if self.options or self.arguments[0].startswith("<") or self.env.app.events.listeners.get("include-read"):
+            get_stats(self.env)["skipped"] += 1
+            return super().run()
+
+        _, path = self.env.relfn2path(self.arguments[0])
+        entry = self.get_entry(path)
+        if entry is None or not entry.cacheable:
+            get_stats(self.env)["skipped"] += 1
+            return super().run()
+
+        # Same as the standard directive.
+        self.env.note_included(path)
+        self.state.document.settings.record_dependencies.add(path)
+
+        dictionary = get_dictionary(self.env)
+        for variant in entry.variants:
+            if all(get_hash(dictionary[key] if key in dictionary else None) == value
+                   for key, value in variant.reads.items()):
+                get_stats(self.env)["hits"] += 1
+                for key, value in variant.writes.items():
+                    dictionary[key] = value.deepcopy()
+                return [set_refdoc(node.deepcopy(), variant.docname, self.env.docname) for node in variant.node_list]
+
+        get_stats(self.env)["misses"] += 1
+        document = self.state.document
+        registered = get_registered(document)
+        container = nodes.Element()
+        content = StringList(entry.lines, path)
+        # Otherwise messages and reference nodes are given the lines of the including document.
+        with VariableRecorder(self.env) as recorder, switch_source_input(self.state, content):
+            self.state.nested_parse(content, 0, container)
+
+        # Anything registered with the document is missing from copies.
+        if (get_registered(document) != registered or any(container.findall(is_unattached))
+                or any(is_document_specific(node, self.env.docname) for node in container.findall(nodes.Element))):
+            entry.cacheable = False
+            entry.variants = []
+            return container.children
+
+        entry.variants.insert(0, CacheVariant(self.env.docname, recorder.reads, recorder.writes, container.children))
+        del entry.variants[MAXIMUM_VARIANTS:]
+        return container.children
+
+    def get_entry(self, path):
+        key = (path, tuple(sorted(self.env.app.tags)))
+        try:
+            stat = os.stat(path)
+        except OSError:
+            # The standard directive reports it.
+            return None
+        stat = (stat.st_mtime_ns, stat.st_size)
+        entry = cache.get(key)
+        if entry is not None and entry.stat == stat:
+            return entry
+
+        settings = self.state.document.settings
+        try:
+            with open(path, "rb") as file:
+                data = file.read()
+            text = data.decode(settings.input_encoding or "utf-8-sig", settings.input_encoding_error_handler)
+        except (OSError, UnicodeError):
+            return None
+        digest = hashlib.sha1(data).hexdigest()
+        if entry is not None and entry.digest == digest:
+            entry.stat = stat
+            return entry
+        lines = string2lines(text, settings.tab_width, convert_whitespace=True)
+        entry = cache[key] = CacheEntry(stat, digest, lines, UNCACHEABLE_PATTERN.search(text) is None)
+        return entry
+
+
+def is_unattached(node):
+    # Messages are reported once, and pending nodes are registered with the document for their transform.
+    return isinstance(node, (nodes.system_message, nodes.pending))
+
+
+def is_document_specific(node, docname):
+    # Anything naming the document other than the reference nodes set_refdoc updates (eg the parent of a toctree).
+    if isinstance(node, addnodes.toctree):
+        return True
+    return any(value == docname for name, value in node.attributes.items() if name != "refdoc")
+
+
+def set_refdoc(node, docname, including_docname):
+    # Eg pending_xref and download_reference, which are resolved relative to their refdoc.
+    if docname != including_docname:
+        for child in node.findall(nodes.Element):
+            if child.get("refdoc") == docname:
+                child["refdoc"] = including_docname
+    return node
+
+
+def get_registered(document):
+    return (
+        len(document.ids),
+        len(document.nameids),
+        len(document.substitution_defs),
+        len(document.footnotes) + len(document.autofootnotes) + len(document.symbol_footnotes),
+        len(document.citations),
+        # References are resolved by name through these (eg `Text`_).
+        sum(len(x) for x in document.refnames.values()),
+        sum(len(x) for x in document.refids.values()),
+    )
+
+
+def clear_stats(app, env, docnames):
+    env.include_cache_stats = {}
+
+
+def purge_stats(app, env, docname):
+    if hasattr(env, "include_cache_stats"):
+        env.include_cache_stats.pop(docname, None)
+
+
+def merge_stats(app, env, docnames, other):
+    if not hasattr(env, "include_cache_stats"):
+        env.include_cache_stats = {}
+    for docname in docnames:
+        if docname in getattr(other, "include_cache_stats", {}):
+            env.include_cache_stats[docname] = other.include_cache_stats[docname]
+
+
+def report_stats(app, env):
+    stats = {"hits": 0, "misses": 0, "skipped": 0}
+    for document_stats in getattr(env, "include_cache_stats", {}).values():
+        for key, value in document_stats.items():
+            stats[key] += value
+    if sum(stats.values()) > 0:
+        logger.info(f"include cache: {stats['hits']} hits, {stats['misses']} misses, {stats['skipped']} not cached")
+
+
+def setup(app):
+    app.setup_extension("variables")
+    app.add_directive("include", CachedInclude, override=True)
+    app.connect("env-before-read-docs", clear_stats)
+    app.connect("env-purge-doc", purge_stats)
+    app.connect("env-merge-info", merge_stats)
+    app.connect("env-updated", report_stats)
+    return {
+        'parallel_read_safe': True,
+        'parallel_write_safe': True,
+    }
@@ -3,6 +3,10 @@ from docutils import nodes
 def setup(app):
     app.add_role('branch', autolink('https://github.com/wave-harmonic/crest/tree/%s'))
     app.add_role('wiki', autolink('https://github.com/wave-harmonic/crest/wiki/%s'))
+    return {
+        'parallel_read_safe': True,
+        'parallel_write_safe': True,
+    }
 
 def github(pattern):
     def role(name, rawtext, text, lineno, inliner, options={}, content=[]):
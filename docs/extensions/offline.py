@@ -0,0 +1,105 @@
+import os
+import re
+from html.parser import HTMLParser
+from urllib.parse import urlparse
+from docutils import nodes
+from sphinx.ext.mathjax import html_visit_displaymath, html_visit_math
+from sphinx.transforms.post_transforms import SphinxPostTransform
+from sphinx.util import logging
+
+# Verifies that an offline build does not load anything from another host. Links are fine as they are only followed
+# when clicked, but scripts, stylesheets, images and frames would stall or break the page without a network.
+
+logger = logging.getLogger(__name__)
+
+RESOURCE_ATTRIBUTES = {
+    "audio": "src",
+    "embed": "src",
+    "iframe": "src",
+    "img": "src",
+    "link": "href",
+    "object": "data",
+    "script": "src",
+    "source": "src",
+    "video": "src",
+}
+
+# Link elements which only point somewhere (eg canonical) are not loaded.
+LINK_RESOURCE_TYPES = {"icon", "modulepreload", "preload", "prefetch", "stylesheet"}
+
+CSS_URL_PATTERN = re.compile(r"""(?:url\(\s*|@import\s+)["']?([^"')\s]+)""")
+
+
+def is_external(url):
+    return urlparse(url.strip()).netloc != ""
+
+
+class ExternalResourceParser(HTMLParser):
+    def __init__(self):
+        super().__init__()
+        self.urls = []
+
+    def handle_starttag(self, tag, attrs):
+        attrs = dict(attrs)
+        if tag == "link" and not LINK_RESOURCE_TYPES & set((attrs.get("rel") or "").lower().split()):
+            return
+        url = attrs.get(RESOURCE_ATTRIBUTES.get(tag))
+        if url is not None and is_external(url):
+            self.urls.append(url)
+        for candidate in (attrs.get("srcset") or "").split(","):
+            if candidate.strip() and is_external(candidate.split()[0]):
+                self.urls.append(candidate.split()[0])
+
+
+class RemoveExternalImages(SphinxPostTransform):
+    # Images from other hosts (eg badges and asset store cards) cannot be shown so they are dropped.
+    default_priority = 100
+    formats = ("html",)
+
+    def run(self):
+        for node in list(self.document.findall(nodes.image)):
+            if not is_external(node["uri"]):
+                continue
+            # Do not leave an empty link behind (eg a badge).
+            if isinstance(node.parent, nodes.reference) and len(node.parent) == 1:
+                node = node.parent
+            node.parent.remove(node)
+
+
+def find_external_resources(path):
+    with open(path, encoding="utf-8", errors="replace") as file:
+        content = file.read()
+    if path.endswith(".css"):
+        return [url for url in CSS_URL_PATTERN.findall(content) if is_external(url)]
+    parser = ExternalResourceParser()
+    parser.feed(content)
+    return parser.urls
+
+
+def verify_output(app, exception):
+    if exception is not None or app.builder.format != "html":
+        return
+
+    count = 0
+    for root, _, files in os.walk(app.outdir):
+        for name in files:
+            if not name.endswith((".html", ".css")):
+                continue
+            path = os.path.join(root, name)
+            for url in find_external_resources(path):
+                count += 1
+                logger.warning("%s: offline build references an external resource: %s", path, url)
+
+    if count == 0:
+        logger.info("offline build references no external resources")
+
+
+def setup(app):
+    # Outputs the same markup as MathJax but without loading it, so the TeX source is shown as is.
+    app.add_html_math_renderer("offline", (html_visit_math, None), (html_visit_displaymath, None))
+    app.add_post_transform(RemoveExternalImages)
+    app.connect("build-finished", verify_output)
+    return {
+        'parallel_read_safe': True,
+        'parallel_write_safe': True,
+    }
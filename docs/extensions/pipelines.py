@@ -0,0 +1,42 @@
+from docutils import nodes
+from sphinx.transforms.post_transforms import SphinxPostTransform
+
+# Marks render pipeline tabs (eg .. tab:: HDRP) with a data-rp attribute so custom.js can select them by the rp URL
+# parameter without searching the label text of every tab.
+
+RENDER_PIPELINES = ("birp", "hdrp", "urp")
+
+# The nodes sphinx-inline-tabs creates for the HTML of a tab are not public, so they are matched by class name rather
+# than imported. tests/test_pipelines.py checks they are still found with the version in requirements.txt.
+TAB_INPUT = "_TabInput"
+TAB_LABEL = "_TabLabel"
+
+
+def is_node(node, class_name):
+    return isinstance(node, nodes.Element) and type(node).__name__ == class_name
+
+
+class MarkPipelineTabs(SphinxPostTransform):
+    # After TabHtmlTransform which creates the inputs and labels.
+    default_priority = 210
+    formats = ("html",)
+
+    def run(self):
+        for label in self.document.findall(lambda node: is_node(node, TAB_LABEL)):
+            name = label.astext().strip().lower()
+            if name not in RENDER_PIPELINES:
+                continue
+            # The input comes right before its label. Both output any extra attributes.
+            index = label.parent.index(label)
+            label["data-rp"] = name
+            if index > 0 and is_node(label.parent[index - 1], TAB_INPUT):
+                label.parent[index - 1]["data-rp"] = name
+
+
+def setup(app):
+    app.setup_extension("sphinx_inline_tabs")
+    app.add_post_transform(MarkPipelineTabs)
+    return {
+        'parallel_read_safe': True,
+        'parallel_write_safe': True,
+    }
@@ -0,0 +1,145 @@
+import importlib
+import json
+import math
+import os
+import time
+from docutils.parsers.rst import directives, roles
+from sphinx.util import logging
+
+# Opt-in timing of every registered directive and role. Enable with "-t profiling" (eg make html O="-t profiling").
+# Times are inclusive so a directive which parses nested content includes the time of the nested directives and roles.
+# A JSON report is written to the output directory and a summary is printed when the build finishes.
+
+logger = logging.getLogger(__name__)
+
+
+def wrap_directive(app, name, cls):
+    extension = cls.__module__.split(".")[0]
+
+    class ProfiledDirective(cls):
+        def run(self):
+            start = time.perf_counter()
+            try:
+                return super().run()
+            finally:
+                record(app.env, extension, "directive", name, time.perf_counter() - start)
+
+    ProfiledDirective.__name__ = cls.__name__
+    return ProfiledDirective
+
+
+def wrap_role(app, name, role):
+    extension = (getattr(role, "__module__", None) or type(role).__module__).split(".")[0]
+
+    def profiled_role(*args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return role(*args, **kwargs)
+        finally:
+            record(app.env, extension, "role", name, time.perf_counter() - start)
+
+    # Docutils reads "options" and "content" from role functions when deriving custom roles.
+    profiled_role.__dict__.update(getattr(role, "__dict__", {}))
+    return profiled_role
+
+
+def record(env, extension, kind, name, duration):
+    docname = env.temp_data.get("docname", "")
+    key = f"{extension}:{kind}:{name}"
+    env.profiling.setdefault(docname, {}).setdefault(key, []).append(duration)
+
+
+def wrap_all(app):
+    app.env.profiling = {}
+    # Builtin docutils directives and roles are only looked up when first used so resolve them now.
+    for name, (module_name, class_name) in directives._directive_registry.items():
+        if name not in directives._directives:
+            module = importlib.import_module(f"docutils.parsers.rst.directives.{module_name}")
+            directives._directives[name] = getattr(module, class_name)
+    for name, role in roles._role_registry.items():
+        roles._roles.setdefault(name, role)
+
+    for name, cls in list(directives._directives.items()):
+        directives._directives[name] = wrap_directive(app, name, cls)
+    for name, role in list(roles._roles.items()):
+        roles._roles[name] = wrap_role(app, name, role)
+    for domain in app.env.domains.values():
+        domain.directives = {
+            name: wrap_directive(app, f"{domain.name}:{name}", cls) for name, cls in domain.directives.items()
+        }
+        domain.roles = {name: wrap_role(app, f"{domain.name}:{name}", role) for name, role in domain.roles.items()}
+
+
+def clear_profiling(app, env, docnames):
+    env.profiling = {}
+
+
+def purge_profiling(app, env, docname):
+    if hasattr(env, "profiling"):
+        env.profiling.pop(docname, None)
+
+
+def merge_profiling(app, env, docnames, other):
+    for docname in docnames:
+        if docname in other.profiling:
+            env.profiling[docname] = other.profiling[docname]
+
+
+def summarize(durations):
+    durations = sorted(durations)
+    return {
+        "calls": len(durations),
+        "cumulative": sum(durations),
+        # Nearest-rank percentile.
+        "p95": durations[max(math.ceil(0.95 * len(durations)) - 1, 0)],
+    }
+
+
+def write_report(app, exception):
+    if exception is not None:
+        return
+
+    by_name = {}
+    by_extension = {}
+    by_document = {}
+    for docname, timings in app.env.profiling.items():
+        for key, durations in timings.items():
+            extension = key.split(":")[0]
+            by_name.setdefault(key, []).extend(durations)
+            by_extension.setdefault(extension, []).extend(durations)
+            by_document.setdefault(docname, {}).setdefault(extension, []).extend(durations)
+
+    report = {
+        "extensions": {key: summarize(value) for key, value in by_extension.items()},
+        "names": {key: summarize(value) for key, value in by_name.items()},
+        "documents": {
+            docname: {key: summarize(value) for key, value in extensions.items()}
+            for docname, extensions in by_document.items()
+        },
+    }
+
+    path = os.path.join(app.outdir, app.config.profiling_report)
+    with open(path, "w", encoding="utf-8") as file:
+        json.dump(report, file, indent=2, sort_keys=True)
+
+    logger.info("")
+    logger.info("Directive and role timings (inclusive):")
+    logger.info(f"{'name':<48} {'calls':>7} {'total (ms)':>11} {'p95 (ms)':>9}")
+    rows = sorted(report["names"].items(), key=lambda item: item[1]["cumulative"], reverse=True)
+    for key, value in rows[:app.config.profiling_summary_length]:
+        logger.info(f"{key:<48} {value['calls']:>7} {value['cumulative'] * 1000:>11.1f} {value['p95'] * 1000:>9.2f}")
+    logger.info(f"Full report written to {path}")
+
+
+def setup(app):
+    app.add_config_value("profiling_report", "profiling.json", "")
+    app.add_config_value("profiling_summary_length", 20, "")
+    app.connect("builder-inited", wrap_all)
+    app.connect("env-before-read-docs", clear_profiling)
+    app.connect("env-purge-doc", purge_profiling)
+    app.connect("env-merge-info", merge_profiling)
+    app.connect("build-finished", write_report)
+    return {
+        'parallel_read_safe': True,
+        'parallel_write_safe': True,
+    }
@@ -0,0 +1,132 @@
+import json
+import os
+import shutil
+import time
+from docutils import nodes
+from sphinx.util import logging
+from variables import findall
+
+# Splits the search index so the search page only downloads the parts a query needs rather than the whole of
+# searchindex.js. The terms are sharded by their first characters and stored with integer document IDs as Sphinx does.
+# _static/search.js loads the shards for a query and hands them to Sphinx's searchtools.js as a partial index.
+#
+# Explanations of abbreviations (eg the render pipeline names from the get role) are indexed too, as Sphinx only
+# indexes the text.
+
+logger = logging.getLogger(__name__)
+
+
+def collect_abbreviations(app, doctree):
+    # Collected when reading as the doctrees are not available for unchanged documents when writing.
+    words = set()
+    for node, _ in findall(app.env, doctree, nodes.abbreviation):
+        words.update(node.get("explanation", "").split())
+    app.env.search_abbreviations[app.env.docname] = words
+
+
+def init_abbreviations(app):
+    if not hasattr(app.env, "search_abbreviations"):
+        app.env.search_abbreviations = {}
+
+
+def purge_abbreviations(app, env, docname):
+    if hasattr(env, "search_abbreviations"):
+        env.search_abbreviations.pop(docname, None)
+
+
+def merge_abbreviations(app, env, docnames, other):
+    for docname in docnames:
+        if docname in other.search_abbreviations:
+            env.search_abbreviations[docname] = other.search_abbreviations[docname]
+
+
+def add_abbreviations(app, indexer):
+    # Same filtering and stemming as IndexBuilder.feed.
+    for docname, words in app.env.search_abbreviations.items():
+        if docname not in indexer._titles:
+            continue
+        for word in indexer.lang.split(" ".join(words)):
+            stemmed_word = indexer.lang.stem(word).lower()
+            if not indexer.lang.word_filter(stemmed_word) and indexer.lang.word_filter(word):
+                stemmed_word = word
+            if indexer.lang.word_filter(stemmed_word):
+                indexer._mapping.setdefault(stemmed_word, set()).add(docname)
+
+
+def get_shard_prefix(term, length):
+    # Lowercased as some terms keep their case (eg when the stemmed word is filtered out), and file names which only
+    # differ by case are the same file on some file systems and hosts.
+    return term[:length].lower()
+
+
+def get_shard_name(prefix):
+    # Anything other than ASCII letters and digits is escaped, including "_" so names cannot clash.
+    return "".join(x if x.isascii() and x.isalnum() else f"_{ord(x):x}" for x in prefix) or "_"
+
+
+def write_json(path, data):
+    with open(path, "w", encoding="utf-8") as file:
+        json.dump(data, file, separators=(",", ":"), ensure_ascii=False)
+    return os.path.getsize(path)
+
+
+def write_index(app, exception):
+    builder = app.builder
+    if exception is not None or builder.format != "html" or not getattr(builder, "indexer", None):
+        return
+
+    start = time.perf_counter()
+    add_abbreviations(app, builder.indexer)
+    index = builder.indexer.freeze()
+    length = app.config.search_shard_prefix_length
+
+    shards = {}
+    for key in ("terms", "titleterms"):
+        for term, documents in index.pop(key).items():
+            shard = shards.setdefault(get_shard_prefix(term, length), {"terms": {}, "titleterms": {}})
+            shard[key][term] = documents
+
+    directory = os.path.join(builder.outdir, app.config.search_directory)
+    shutil.rmtree(directory, ignore_errors=True)
+    os.makedirs(directory)
+
+    sizes = {}
+    for prefix, shard in shards.items():
+        sizes[prefix] = write_json(os.path.join(directory, f"{get_shard_name(prefix)}.json"), shard)
+    # Everything else is small and needed by every query (eg titles). Shards are looked up by the prefix of the term.
+    meta_size = write_json(os.path.join(directory, "meta.json"), {
+        "index": index,
+        "length": length,
+        "shards": {prefix: f"{get_shard_name(prefix)}.json" for prefix in sorted(shards)},
+    })
+
+    full_path = os.path.join(builder.outdir, builder.searchindex_filename)
+    full_size = os.path.getsize(full_path) if os.path.exists(full_path) else 0
+    average_size = sum(sizes.values()) / len(sizes) if sizes else 0
+    logger.info(
+        f"search index: {len(shards)} shards written in {(time.perf_counter() - start) * 1000:.0f} ms, "
+        f"{meta_size / 1024:.1f} KB metadata + {average_size / 1024:.1f} KB per shard on average "
+        f"(largest {max(sizes.values(), default=0) / 1024:.1f} KB), {full_size / 1024:.1f} KB for the full index"
+    )
+
+
+def add_search_directory(app, pagename, templatename, context, doctree):
+    # For _templates/search.html.
+    context["search_directory"] = app.config.search_directory
+
+
+def setup(app):
+    app.setup_extension("variables")
+    app.add_config_value("search_directory", "_search", "html")
+    # Longer prefixes make smaller shards but more of them. Partial matches are only found within the loaded shards.
+    app.add_config_value("search_shard_prefix_length", 1, "html")
+    app.connect("builder-inited", init_abbreviations)
+    app.connect("doctree-read", collect_abbreviations)
+    app.connect("env-purge-doc", purge_abbreviations)
+    app.connect("env-merge-info", merge_abbreviations)
+    app.connect("html-page-context", add_search_directory)
+    app.connect("build-finished", write_index)
+    return {
+        'parallel_read_safe': True,
+        'parallel_write_safe': True,
+    }
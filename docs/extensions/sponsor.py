@@ -1,7 +1,10 @@
+import html
 from docutils import nodes
 from sphinx.util.docutils import SphinxDirective
 from sphinx import addnodes
 
+HTML_TEMPLATE = "<iframe src=\"{link}/button\" title=\"Sponsor {organization}\" height=\"35\" width=\"116\" style=\"border: 0; display: block;\"></iframe>"
+
 class Sponsor(SphinxDirective):
 
     has_content = True
@@ -9,6 +12,8 @@ class Sponsor(SphinxDirective):
     def run(self):
         sponsor_link = self.env.config.sponsor_link
         organization = self.env.config.organization
+        if not sponsor_link.startswith(("https://", "http://")):
+            raise self.error(f"sponsor_link must be set to a URL in conf.py (got {sponsor_link!r})")
 
         admonition_node = nodes.admonition(classes=["admonition-sponsor"])
         admonition_node += nodes.title(text="Sponsor")
@@ -19,15 +24,15 @@ class Sponsor(SphinxDirective):
         self.state.nested_parse(self.content, self.content_offset, node_list)
         admonition_node += node_list.children
 
-        # Add sponsor button for HTML and fallback for PDF.
-        html = f"<iframe src=\"{sponsor_link}/button\" title=\"Sponsor {organization}\" height=\"35\" width=\"116\" style=\"border: 0; display: block;\"></iframe>"
-        html_node = nodes.raw(text=html, format="html")
-        only_pdf = addnodes.only(expr="latex")
-        only_pdf_paragraph = nodes.inline()
-        self.state.nested_parse(nodes.inline(text=f":link:`Sponsor Us <{sponsor_link}?o=esb>`"), 0, only_pdf_paragraph)
-        only_pdf += only_pdf_paragraph
+        # Add sponsor button for HTML and fallback for PDF and offline builds.
+        html_text = HTML_TEMPLATE.format(link=html.escape(sponsor_link), organization=html.escape(organization))
+        only_html = addnodes.only(expr="not offline")
+        only_html += nodes.raw(text=html_text, format="html")
+        only_pdf = addnodes.only(expr="latex or offline")
+        # Built directly rather than parsing the link role.
+        only_pdf += nodes.paragraph("", "", nodes.reference("Sponsor Us", "Sponsor Us", refuri=f"{sponsor_link}?o=esb"))
 
-        admonition_node += html_node
+        admonition_node += only_html
         admonition_node += only_pdf
 
         return [admonition_node]
@@ -1,21 +1,69 @@
-from sphinx.util.docutils import SphinxDirective
+import functools
+from jinja2 import nodes
+from sphinx.util.tags import BooleanParser, env
 
-class Tags(SphinxDirective):
 
-    def run(self):
-        # If HTML or ReadTheDocs, then we don't need stripping based on pipeline.
-        # We need to do this here because builder tags is populated after conf.py is loaded.
-        tags = self.env.app.tags
-        if tags.has("html") or tags.has("readthedocs"):
-            tags.add("birp")
-            tags.add("hdrp")
-            tags.add("urp")
+def add_tags(app):
+    # If HTML or ReadTheDocs, then we don't need stripping based on pipeline.
+    # We need to do this here because builder tags is populated after conf.py is loaded.
+    tags = app.tags
+    if tags.has("html") or tags.has("readthedocs"):
+        tags.add("birp")
+        tags.add("hdrp")
+        tags.add("urp")
 
-        # We only do stripping in local PDFs.
-        if tags.has("latex") and not tags.has("readthedocs"):
-            tags.add("stripping")
+    # We only do stripping in local PDFs.
+    if tags.has("latex") and not tags.has("readthedocs"):
+        tags.add("stripping")
+
+    # Tags do not change after this so conditions can be evaluated against this set.
+    app.builder.effective_tags = frozenset(tags)
+
+
+@functools.lru_cache(maxsize=None)
+def compile_condition(condition):
+    # Same grammar as Tags.eval_condition but parsed once into a function of the tag set. Like it, constants (eg true)
+    # are invalid.
+    parser = BooleanParser(env, condition, state="variable")
+    expr = parser.parse_expression()
+    if not parser.stream.eos:
+        raise ValueError("chunk after expression")
+
+    def compile_node(node):
+        if isinstance(node, nodes.CondExpr):
+            test, expr1, expr2 = compile_node(node.test), compile_node(node.expr1), compile_node(node.expr2)
+            return lambda tags: expr1(tags) if test(tags) else expr2(tags)
+        elif isinstance(node, nodes.And):
+            left, right = compile_node(node.left), compile_node(node.right)
+            return lambda tags: left(tags) and right(tags)
+        elif isinstance(node, nodes.Or):
+            left, right = compile_node(node.left), compile_node(node.right)
+            return lambda tags: left(tags) or right(tags)
+        elif isinstance(node, nodes.Not):
+            inner = compile_node(node.node)
+            return lambda tags: not inner(tags)
+        elif isinstance(node, nodes.Name):
+            return lambda tags: node.name in tags
+        raise ValueError("invalid node, check parsing")
+
+    return compile_node(expr)
+
+
+@functools.lru_cache(maxsize=None)
+def evaluate(tags, condition):
+    return compile_condition(condition)(tags)
+
+
+def eval_condition(app, condition):
+    # Use instead of app.tags.eval_condition which parses the condition every time. Raises like it for invalid conditions.
+    return evaluate(app.builder.effective_tags, condition)
 
-        return []
 
 def setup(app):
-    app.add_directive("tags", Tags)
+    # Tags are resolved once per build rather than while reading a document. This way doctrees do not depend on the
+    # pipeline tags and can be shared between the pipeline PDFs.
+    app.connect("builder-inited", add_tags)
+    return {
+        'parallel_read_safe': True,
+        'parallel_write_safe': True,
+    }
@@ -0,0 +1,323 @@
+import html
+import io
+import json
+import os
+import pickle
+import sys
+import time
+import tracemalloc
+from sphinx.util import logging
+
+# Opt-in time and memory per document for each phase of the build. Enable with "-t telemetry" (eg make html
+# O="-t telemetry" or make pdf O="-t telemetry").
+#   - Read: from source-read to doctree-read, with the number of nodes and the size of the pickled doctree.
+#   - Resolve: get_and_resolve_doctree including the doctree-resolved handlers, with the number of nodes after.
+#   - Write: the builder's write_doc.
+# Memory is the peak allocated by Python during each (tracemalloc) above what was allocated when it started. The
+# environment is broken down by the pickled size of each attribute to show what it holds.
+#
+# A JSON report and an HTML table which sorts when clicking a column are written to the output directory, and the
+# slowest documents are printed when the build finishes.
+#
+# Resolve and write are only measured for documents written one at a time in this process. With -j the writing happens
+# in other processes, and builders which write all documents as one (eg LaTeX) only have read times and node counts.
+# tracemalloc makes the build a few times slower so compare times with it off (-D telemetry_tracemalloc=0).
+
+logger = logging.getLogger(__name__)
+
+PHASES = ("read", "resolve", "write")
+
+
+def start_tracing(app, config):
+    if config.telemetry_tracemalloc and not tracemalloc.is_tracing():
+        tracemalloc.start()
+
+
+def start():
+    memory = tracemalloc.get_traced_memory()[0] if tracemalloc.is_tracing() else 0
+    if tracemalloc.is_tracing():
+        tracemalloc.reset_peak()
+    return time.perf_counter(), memory
+
+
+def stop(started):
+    entry = {"time": time.perf_counter() - started[0]}
+    if tracemalloc.is_tracing():
+        entry["memory"] = max(0, tracemalloc.get_traced_memory()[1] - started[1])
+    return entry
+
+
+def count_nodes(doctree):
+    return sum(1 for _ in doctree.findall())
+
+
+def start_reading(app, env, docnames):
+    # Per build so the report only covers this build (eg with live.py).
+    app.telemetry_started = time.perf_counter()
+    app.telemetry_phases = {}
+    env.telemetry = {}
+
+
+def finish_reading(app, env):
+    app.telemetry_phases["read"] = time.perf_counter() - app.telemetry_started
+
+
+def start_document(app, docname, source):
+    app.env.temp_data["telemetry"] = start()
+
+
+def finish_document(app, doctree):
+    started = app.env.temp_data.pop("telemetry", None)
+    if started is None:
+        return
+    entry = stop(started)
+    entry["nodes"] = count_nodes(doctree)
+    app.env.telemetry[app.env.docname] = {"read": entry}
+
+
+def purge_telemetry(app, env, docname):
+    if hasattr(env, "telemetry"):
+        env.telemetry.pop(docname, None)
+
+
+def merge_telemetry(app, env, docnames, other):
+    for docname in docnames:
+        if docname in getattr(other, "telemetry", {}):
+            env.telemetry[docname] = other.telemetry[docname]
+
+
+class EnvironmentPickler(pickle.Pickler):
+    # Some attributes refer back to the environment (eg settings) which would otherwise count all of it.
+    def __init__(self, file, env):
+        super().__init__(file, pickle.HIGHEST_PROTOCOL)
+        self.env = env
+
+    def persistent_id(self, obj):
+        return "env" if obj is self.env else None
+
+
+def measure_environment(env):
+    # Pickled one after the other so anything shared is only counted for the first attribute which refers to it.
+    file = io.BytesIO()
+    pickler = EnvironmentPickler(file, env)
+    attributes = {}
+    for name, value in env.__getstate__().items():
+        position = file.tell()
+        try:
+            pickler.dump(value)
+        except Exception:
+            file.seek(position)
+            file.truncate()
+            continue
+        attributes[name] = file.tell() - position
+    return attributes
+
+
+def wrap_builder(app):
+    # Writing starts after the environment is pickled (if anything was read) so the wrapper around
+    # get_and_resolve_doctree is not pickled with it.
+    builder = app.builder
+    write = builder.write
+    write_doc = builder.write_doc
+
+    def timed_write(*args, **kwargs):
+        env = builder.env
+        builder.telemetry = {}
+        builder.telemetry_environment = measure_environment(env)
+        get_and_resolve_doctree = env.get_and_resolve_doctree
+
+        def timed_resolve(docname, *args, **kwargs):
+            started = start()
+            try:
+                return get_and_resolve_doctree(docname, *args, **kwargs)
+            finally:
+                builder.telemetry.setdefault(docname, {}).setdefault("resolve", {}).update(stop(started))
+
+        env.get_and_resolve_doctree = timed_resolve
+        started = time.perf_counter()
+        try:
+            return write(*args, **kwargs)
+        finally:
+            app.telemetry_phases["write"] = time.perf_counter() - started
+            env.__dict__.pop("get_and_resolve_doctree", None)
+
+    def timed_write_doc(docname, *args, **kwargs):
+        started = start()
+        try:
+            return write_doc(docname, *args, **kwargs)
+        finally:
+            builder.telemetry.setdefault(docname, {})["write"] = stop(started)
+
+    builder.write = timed_write
+    builder.write_doc = timed_write_doc
+
+
+def count_resolved(app, doctree, docname):
+    if hasattr(app.builder, "telemetry"):
+        app.builder.telemetry.setdefault(docname, {}).setdefault("resolve", {})["nodes"] = count_nodes(doctree)
+
+
+def get_peak_memory():
+    # Same as benchmark.py.
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = max(
+        resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+        resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss,
+    )
+    return peak / 1024 / 1024 if sys.platform == "darwin" else peak / 1024
+
+
+def get_documents(app):
+    documents = {}
+    written = getattr(app.builder, "telemetry", {})
+    for docname in sorted(app.env.found_docs):
+        document = {"name": docname}
+        document.update(getattr(app.env, "telemetry", {}).get(docname, {}))
+        document.update(written.get(docname, {}))
+        path = os.path.join(app.doctreedir, f"{docname}.doctree")
+        if os.path.exists(path):
+            document["doctree"] = os.path.getsize(path)
+        document["time"] = sum(document[x]["time"] for x in PHASES if "time" in document.get(x, {}))
+        documents[docname] = document
+    return documents
+
+
+def write_html(path, report):
+    columns = [
+        ("Document", lambda x: x["name"]),
+        ("Total (ms)", lambda x: x["time"] * 1000),
+        ("Read (ms)", lambda x: x.get("read", {}).get("time", 0) * 1000),
+        ("Read memory (KB)", lambda x: x.get("read", {}).get("memory", 0) / 1024),
+        ("Nodes", lambda x: x.get("read", {}).get("nodes", 0)),
+        ("Doctree (KB)", lambda x: x.get("doctree", 0) / 1024),
+        ("Resolve (ms)", lambda x: x.get("resolve", {}).get("time", 0) * 1000),
+        ("Resolve memory (KB)", lambda x: x.get("resolve", {}).get("memory", 0) / 1024),
+        ("Resolved nodes", lambda x: x.get("resolve", {}).get("nodes", 0)),
+        ("Write (ms)", lambda x: x.get("write", {}).get("time", 0) * 1000),
+        ("Write memory (KB)", lambda x: x.get("write", {}).get("memory", 0) / 1024),
+    ]
+    documents = sorted(report["documents"].values(), key=lambda x: x["time"], reverse=True)
+    rows = []
+    for document in documents:
+        cells = []
+        for index, (_, get) in enumerate(columns):
+            value = get(document)
+            if index == 0:
+                cells.append(f"<td>{html.escape(value)}</td>")
+            else:
+                cells.append(f'<td data-value="{value:.3f}">{value:,.0f}</td>' if value else '<td data-value="0"></td>')
+        rows.append(f"<tr>{''.join(cells)}</tr>")
+    environment = sorted(report["environment"]["attributes"].items(), key=lambda x: x[1], reverse=True)
+
+    with open(path, "w", encoding="utf-8") as file:
+        file.write(f"""<!DOCTYPE html>
+<html lang="en">
+<head>
+<meta charset="utf-8">
+<title>Build telemetry</title>
+<style>
+body {{ font-family: sans-serif; font-size: 14px; }}
+table {{ border-collapse: collapse; }}
+th, td {{ padding: 2px 8px; border-bottom: 1px solid #ddd; }}
+td:not(:first-child) {{ text-align: right; }}
+th {{ cursor: pointer; text-align: left; position: sticky; top: 0; background: #eee; }}
+</style>
+</head>
+<body>
+<h1>Build telemetry</h1>
+<p>{html.escape(report['builder'])} builder. Read {report['phases'].get('read', 0):.1f}s, write {report['phases'].get('write', 0):.1f}s, total {report['phases']['total']:.1f}s. Peak memory {report['peak_memory_mb'] or 0:.0f} MB. Click a column to sort.</p>
+<table id="documents">
+<thead><tr>{''.join(f'<th>{html.escape(name)}</th>' for name, _ in columns)}</tr></thead>
+<tbody>
+{chr(10).join(rows)}
+</tbody>
+</table>
+<h2>Environment ({report['environment']['total'] / 1024:,.0f} KB pickled)</h2>
+<table>
+<thead><tr><th>Attribute</th><th>KB</th></tr></thead>
+<tbody>
+{chr(10).join(f'<tr><td>{html.escape(name)}</td><td>{size / 1024:,.0f}</td></tr>' for name, size in environment)}
+</tbody>
+</table>
+<script>
+for (const [index, header] of document.querySelectorAll("#documents th").entries()) {{
+    header.addEventListener("click", () => {{
+        const body = document.querySelector("#documents tbody")
+        const descending = header.dataset.order !== "descending"
+        header.dataset.order = descending ? "descending" : "ascending"
+        const value = row => index === 0 ? row.cells[0].textContent : parseFloat(row.cells[index].dataset.value)
+        const rows = [...body.rows].sort((a, b) => (value(a) > value(b) ? 1 : value(a) < value(b) ? -1 : 0) * (descending ? -1 : 1))
+        body.append(...rows)
+    }})
+}}
+</script>
+</body>
+</html>
+""")
+
+
+def write_report(app, exception):
+    if exception is not None:
+        return
+
+    phases = app.telemetry_phases
+    phases["total"] = time.perf_counter() - app.telemetry_started
+    attributes = getattr(app.builder, "telemetry_environment", {})
+    report = {
+        "builder": app.builder.name,
+        "tracemalloc": tracemalloc.is_tracing(),
+        "phases": phases,
+        "peak_memory_mb": get_peak_memory(),
+        "environment": {"total": sum(attributes.values()), "attributes": attributes},
+        "documents": get_documents(app),
+    }
+
+    os.makedirs(app.outdir, exist_ok=True)
+    path = os.path.join(app.outdir, app.config.telemetry_report)
+    with open(f"{path}.json", "w", encoding="utf-8") as file:
+        json.dump(report, file, indent=2, sort_keys=True)
+    write_html(f"{path}.html", report)
+
+    documents = [x for x in report["documents"].values() if x["time"] > 0]
+    if not documents:
+        logger.info(f"No documents were read or written. Report written to {path}.html and {path}.json")
+        return
+
+    logger.info("")
+    logger.info("Slowest documents:")
+    logger.info(f"{'document':<48} {'total (ms)':>11} {'read (ms)':>10} {'nodes':>7} {'memory (KB)':>12}")
+    documents.sort(key=lambda x: x["time"], reverse=True)
+    for document in documents[:app.config.telemetry_summary_length]:
+        read = document.get("read", {})
+        memory = max(document.get(x, {}).get("memory", 0) for x in PHASES)
+        logger.info(
+            f"{document['name']:<48} {document['time'] * 1000:>11.1f} {read.get('time', 0) * 1000:>10.1f} "
+            f"{read.get('nodes', 0):>7} {memory / 1024:>12.0f}"
+        )
+    logger.info(f"Full report written to {path}.html and {path}.json")
+
+
+def setup(app):
+    # Relative to the output directory, without the extension.
+    app.add_config_value("telemetry_report", "telemetry", "")
+    app.add_config_value("telemetry_summary_length", 10, "")
+    app.add_config_value("telemetry_tracemalloc", True, "")
+    app.connect("config-inited", start_tracing)
+    app.connect("builder-inited", wrap_builder)
+    app.connect("env-before-read-docs", start_reading)
+    app.connect("source-read", start_document)
+    # After the other handlers so they are included in the time.
+    app.connect("doctree-read", finish_document, priority=1000)
+    app.connect("env-purge-doc", purge_telemetry)
+    app.connect("env-merge-info", merge_telemetry)
+    app.connect("env-updated", finish_reading)
+    app.connect("doctree-resolved", count_resolved, priority=1000)
+    # After everything else (eg fingerprint.py and compress.py).
+    app.connect("build-finished", write_report, priority=1000)
+    return {
+        'parallel_read_safe': True,
+        'parallel_write_safe': True,
+    }
@@ -1,8 +1,16 @@
+import re
 from docutils import nodes
 from sphinx.util.docutils import SphinxDirective
 from sphinx import addnodes
 
-import inspect
+# Boards and cards (eg https://trello.com/c/AbCd1234/12-name).
+LINK_PATTERN = re.compile(r"""^https://trello\.com/([bc])/[A-Za-z0-9]+(?:/[^\s"'<>]*)?$""")
+EMBED_TYPES = {"b": "Board", "c": "Card"}
+
+HTML_TEMPLATE = """
+        <blockquote class="trello-{type}-compact">
+            <a href="{link}">Trello {embed_type}</a>
+        </blockquote>"""
 
 class Trello(SphinxDirective):
 
@@ -11,27 +19,39 @@ class Trello(SphinxDirective):
 
     def run(self):
         link = self.arguments[0]
-        embed_type = "Card" if "/c/" in link else "Board"
+        match = LINK_PATTERN.match(link)
+        if match is None:
+            raise self.error(f"Invalid Trello link: {link!r} (expected https://trello.com/b/... or https://trello.com/c/...)")
+        embed_type = EMBED_TYPES[match[1]]
 
         container = nodes.container()
 
-        html = f"""
-        <blockquote class="trello-{embed_type.lower()}-compact">
-            <a href="{link}">Trello {embed_type}</a>
-        </blockquote>"""
-
-        html_node = nodes.raw(text=html, format="html")
-        only_pdf = addnodes.only(expr="latex")
-        # We need to provide a node for nested parsing. And another node for populating the parsed node.
-        only_pdf_paragraph = nodes.inline()
-        self.state.nested_parse(nodes.inline(text=f"`Trello {embed_type} <{link}>`_"), 0, only_pdf_paragraph)
-        only_pdf += only_pdf_paragraph
-        container += html_node
+        html = HTML_TEMPLATE.format(type=embed_type.lower(), link=link, embed_type=embed_type)
+
+        # Marked so the script is only added to pages with an embed.
+        html_node = nodes.raw(text=html, format="html", trello=True)
+        only_html = addnodes.only(expr="html and not offline")
+        only_html += html_node
+        only_pdf = addnodes.only(expr="latex or offline")
+        # Built directly rather than parsing a hyperlink reference, which would also add a named target per embed.
+        text = f"Trello {embed_type}"
+        only_pdf += nodes.paragraph("", "", nodes.reference(text, text, refuri=link))
+        container += only_html
         container += only_pdf
         return container.children
 
+def add_trello_script(app, pagename, templatename, context, doctree):
+    # The script turns the blockquotes into iframes. Only nodes have been resolved by now so there are no embeds for
+    # offline builds.
+    if doctree is None or doctree.next_node(lambda node: isinstance(node, nodes.raw) and node.get("trello")) is None:
+        return
+    app.add_js_file(app.config.trello_script, loading_method="async")
+
+
 def setup(app):
+    app.add_config_value("trello_script", "https://p.trellocdn.com/embed.min.js", "html")
     app.add_directive("trello", Trello)
+    app.connect("html-page-context", add_trello_script)
     return {
         'parallel_read_safe': True,
         'parallel_write_safe': True,
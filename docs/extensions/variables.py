@@ -1,10 +1,20 @@
+import hashlib
 import re
-from docutils import nodes
+import weakref
+from collections import ChainMap
+from types import MappingProxyType
+from docutils import frontend, nodes, utils
+from docutils.parsers.rst import Parser
 from sphinx import addnodes
-from sphinx.util.docutils import SphinxDirective, SphinxRole
+from sphinx.transforms import SphinxTransform
+from sphinx.transforms.post_transforms import SphinxPostTransform
+from sphinx.util import logging
+from sphinx.util.docutils import LoggingReporter, SphinxDirective, SphinxRole, sphinx_domains
+from sphinx.util.rst import default_role
+from tags import eval_condition
 
 
-dictionary = {}
+logger = logging.getLogger(__name__)
 
 
 class VariableSet(SphinxDirective):
@@ -15,8 +25,12 @@ class VariableSet(SphinxDirective):
         # First token is the key. We only support one line.
         [key, value] = self.content[0].split(" ", 1)
         node_list = []
+        dictionary = get_dictionary(self.env)
         # Replace content with content without key.
-        self.content[0] = brace_substitution_text(value)
+        try:
+            self.content[0] = brace_substitution_text(dictionary, value)
+        except ValueError as error:
+            raise self.error(f"Cannot set {key}: {error}")
         # Parse will produce nodes and add them to the node list.
         self.state.nested_parse(self.content, 0, node_list)
         # We only want the contents of the list to be store. Since this is inline, there is only one line.
@@ -26,15 +40,21 @@ class VariableSet(SphinxDirective):
 
 
 def link_role(name, rawtext, text, lineno, inliner, options={}, content=[]):
+    dictionary = get_dictionary(inliner.document.settings.env)
     # Split the content so we have text and parameters.
     # :link:`Text Content <parameter>`
     index = text.index(" <")
     link_text = text[:index].strip()
     parameters = text[index:].strip()
-    # Text substitution only for URLs using braces.
-    parameters = brace_substitution_text(parameters)
-    # Text substitution outputting as nodes for the text content. Also uses braces.
-    node_list = brace_substitution_node(link_text)
+    try:
+        # Text substitution only for URLs using braces.
+        parameters = brace_substitution_text(dictionary, parameters)
+        # Text substitution outputting as nodes for the text content. Also uses braces.
+        node_list = brace_substitution_node(dictionary, link_text)
+    except ValueError as error:
+        message = inliner.reporter.error(error, line=lineno)
+        node = inliner.problematic(rawtext, rawtext, message)
+        return [node], [message]
     # Create the link node and add the content. Remove the angle brackets.
     node = nodes.reference(refuri=parameters[1:-1])
     node += node_list
@@ -44,69 +64,315 @@ def link_role(name, rawtext, text, lineno, inliner, options={}, content=[]):
 class VariableRole(SphinxRole):
     def run(self):
         try:
-            tags = self.env.app.tags
+            dictionary = get_dictionary(self.env)
             keys = self.text.split()
 
             # NOTE: Only first key is used. The remainder are thrown away, but could also be used.
             if not keys[0].startswith("["):
-                return dictionary[keys[0]], []
+                return value_nodes(dictionary, keys[0]), []
 
             # Bypass label stripping
             if keys[0].startswith("[[") and keys[0].endswith("]]"):
-                return dictionary[keys[0][1:-1]], []
+                return value_nodes(dictionary, keys[0][1:-1]), []
 
-            # Implicit stripping of labels ([label]).
-            node_list = []
+            # Implicit stripping of labels ([label]). Stripping is done by LabelStripping per builder so the doctree
+            # does not depend on the pipeline tags.
+            node_list = labels(expr=" or ".join(key[1:-1].lower() for key in keys))
             is_first = False
             for key in keys:
                 if not is_first:
                     is_first = True
                 else:
-                    node_list += nodes.inline(text=" ")
-                if tags.has("stripping") and tags.eval_condition(key[1:-1].lower()):
-                    return [], []
-                node_list += dictionary[key]
+                    node_list += nodes.Text(" ")
+                node_list += value_nodes(dictionary, key)
 
-            return node_list, []
+            return [node_list], []
         except Exception as error:
             message = self.inliner.reporter.error(error, line=self.lineno)
             node = self.inliner.problematic(self.rawtext, self.rawtext, message)
             return [node], [message]
 
 
+# A global variable which is replaced with a copy of its value by VariableResolution when writing. This keeps the values
+# out of every doctree that uses them. The text is kept as a child for anything reading the text when reading (eg brace
+# substitution and smart quotes).
+class variable(nodes.Inline, nodes.TextElement):
+    pass
+
+
+class VariableResolution(SphinxPostTransform):
+    # Before anything else as the values can contain nodes which other post-transforms handle.
+    default_priority = 5
+
+    def run(self):
+        resolve_variables(self.env, self.document)
+
+
+class TitleVariableResolution(SphinxTransform):
+    # Titles are collected when reading (eg for the navigation) and are rendered without post-transforms.
+    default_priority = 500
+
+    def apply(self):
+        for title in self.document.findall(nodes.title):
+            resolve_variables(self.env, title)
+
+
+# Labels which will be stripped when building a PDF for a pipeline they match.
+class labels(nodes.Inline, nodes.Element):
+    pass
+
+
+def visit_labels(self, node):
+    # Only reached when rendering outside of the main doctree (eg titles) where labels are never stripped.
+    pass
+
+
+def depart_labels(self, node):
+    pass
+
+
+class LabelStripping(SphinxPostTransform):
+    default_priority = 40
+
+    def run(self):
+        stripping = "stripping" in self.app.builder.effective_tags
+        for node in list(self.document.findall(labels)):
+            try:
+                if stripping and eval_condition(self.app, node["expr"]):
+                    node.parent.remove(node)
+                    continue
+            except Exception as error:
+                logger.warning("Failed to evaluate labels %r: %s", node["expr"], error, location=node)
+            node.replace_self(node.children)
+
+
+def read_global_variables(app, env, added, changed, removed):
+    # Parse the global variables once per build. They used to be in rst_prolog which meant every page parsed them again.
+    env.variable_globals = {}
+    settings = frontend.get_default_settings(Parser)
+    for key, value in env.settings.items():
+        setattr(settings, key, value)
+    document = utils.new_document("<variables_prolog>", settings)
+    document.reporter = LoggingReporter.from_reporter(document.reporter)
+    # No document is being read so the set directive will write to the globals.
+    with sphinx_domains(env), default_role("", app.config.default_role):
+        Parser().parse(app.config.variables_prolog, document)
+
+    # Sphinx does not know which documents use which variables so we re-read the documents which used a global
+    # variable that has changed since the last build. Brace substitution happens when setting so a change will
+    # propagate to the hashes of dependent variables.
+    hashes = {key: hash_node(node) for key, node in env.variable_globals.items()}
+    previous = getattr(env, "variable_hashes", {})
+    env.variable_hashes = hashes
+    changed_keys = {key for key in hashes.keys() | previous.keys() if hashes.get(key) != previous.get(key)}
+    if not changed_keys:
+        return []
+    return [docname for docname, keys in env.variable_dependencies.items() if keys & changed_keys]
+
+
+def purge_variables(app, env, docname):
+    if hasattr(env, "variable_dictionary"):
+        env.variable_dictionary.pop(docname, None)
+    if hasattr(env, "variable_dependencies"):
+        env.variable_dependencies.pop(docname, None)
+
+
+def merge_variables(app, env, docnames, other):
+    for name in ["variable_dictionary", "variable_dependencies"]:
+        if not hasattr(env, name):
+            setattr(env, name, {})
+        if hasattr(other, name):
+            for docname in docnames:
+                if docname in getattr(other, name):
+                    getattr(env, name)[docname] = getattr(other, name)[docname]
+
+
 def setup(app):
+    app.setup_extension("tags")
+    # Changes are tracked per variable by read_global_variables so there is no need to rebuild everything.
+    app.add_config_value("variables_prolog", "", "")
     app.add_directive("set", VariableSet)
     app.add_role("get", VariableRole())
     app.add_role('link', link_role)
+    app.add_node(
+        labels,
+        html=(visit_labels, depart_labels),
+        latex=(visit_labels, depart_labels),
+        text=(visit_labels, depart_labels),
+        man=(visit_labels, depart_labels),
+        texinfo=(visit_labels, depart_labels),
+    )
+    app.add_transform(TitleVariableResolution)
+    app.add_post_transform(VariableResolution)
+    app.add_post_transform(LabelStripping)
+    app.connect("env-get-outdated", read_global_variables)
+    app.connect("env-purge-doc", purge_variables)
+    app.connect("env-merge-info", merge_variables)
+    return {
+        'parallel_read_safe': True,
+        'parallel_write_safe': True,
+    }
 
 
 ##############################################################################
 # Utility Functions
 ##############################################################################
 
-def brace_substitution_text(text):
-    for marker in re.findall(r"\{[^{}]+\}", text):
-        # We remove the braces to get the key.
-        text = text.replace(marker, dictionary[marker[1:-1]][0].astext())
-    return text
+class VariableTable(ChainMap):
+    # Variables set in a document (or its includes) are scoped to that document and shadow the globals, which are
+    # read-only from a document's point of view. Global lookups are recorded so the document can be re-read when they
+    # change. This includes unknown keys as they could be added later.
 
+    def __init__(self, local, globals, used, recorders):
+        super().__init__(local, MappingProxyType(globals))
+        self.used = used
+        self.recorders = recorders
 
-def brace_substitution_node(text):
-    # Text substitution outputting as nodes for the text content. Also uses braces.
-    node_list = []
-    # Make sure we only do substitutions when we are within a brace. We do NOT support nested braces.
-    is_within_brace = False
-    # Use () to keep the delimiters.
-    for part in re.split(r"([{}])", text):
-        if part == "{":
-            is_within_brace = True
-            continue
-        elif part == "}":
-            is_within_brace = False
+    def __getitem__(self, key):
+        self.record(key)
+        return super().__getitem__(key)
+
+    def __contains__(self, key):
+        self.record(key)
+        return super().__contains__(key)
+
+    def __setitem__(self, key, value):
+        for recorder in self.recorders:
+            recorder.writes[key] = value
+        super().__setitem__(key, value)
+
+    def record(self, key):
+        if key not in self.maps[0]:
+            self.used.add(key)
+        for recorder in self.recorders:
+            if key not in recorder.writes and key not in recorder.reads:
+                recorder.reads[key] = self.maps[0].get(key, self.maps[1].get(key))
+
+
+class VariableRecorder:
+    # Records the variables read (with their values at the time, or None if unknown) and set while parsing part of a
+    # document (eg an include by includes.py). Reads of variables set by the same part are not recorded.
+
+    def __init__(self, env):
+        self.recorders = env.temp_data.setdefault("variable_recorders", [])
+        self.reads = {}
+        self.writes = {}
+
+    def __enter__(self):
+        self.recorders.append(self)
+        return self
+
+    def __exit__(self, *args):
+        self.recorders.remove(self)
+
+
+def get_dictionary(env):
+    for name in ["variable_dictionary", "variable_dependencies", "variable_globals"]:
+        if not hasattr(env, name):
+            setattr(env, name, {})
+    docname = env.temp_data.get("docname")
+    if docname is None:
+        return env.variable_globals
+    return VariableTable(
+        env.variable_dictionary.setdefault(docname, {}),
+        env.variable_globals,
+        env.variable_dependencies.setdefault(docname, set()),
+        env.temp_data.get("variable_recorders", []),
+    )
+
+
+def hash_node(node):
+    return hashlib.sha1(node.pformat().encode()).hexdigest()
+
+
+# Hashes of stored values, which are never mutated once set.
+hash_cache = weakref.WeakKeyDictionary()
+
+
+def get_hash(node):
+    if node is None:
+        return None
+    if node not in hash_cache:
+        hash_cache[node] = hash_node(node)
+    return hash_cache[node]
+
+
+def copy_nodes(node):
+    # The stored nodes are kept in the environment so hand out copies. Otherwise inserting them into the doctree would
+    # reparent them and the environment pickle would drag the whole doctree along with it.
+    return [child.deepcopy() for child in node]
+
+
+def value_nodes(dictionary, key):
+    # Global values are referenced and resolved when writing. Values set in the document are copied now as they can be
+    # set again further down (eg per pipeline includes). The lookup also records the dependency on a global.
+    value = lookup(dictionary, key)
+    if isinstance(dictionary, VariableTable) and key not in dictionary.maps[0]:
+        return [variable(value.astext(), value.astext(), key=key)]
+    return copy_nodes(value)
+
+
+def resolve_variables(env, node):
+    for reference in list(node.findall(variable)):
+        value = env.variable_globals.get(reference["key"])
+        if value is None:
+            # Should not happen as documents using a removed global are read again.
+            logger.warning("Unknown variable: %s", reference["key"], location=reference)
+            reference.replace_self(reference.children)
             continue
-        if is_within_brace and part in dictionary:
-            node_list += dictionary[part]
+        reference.replace_self(copy_nodes(value))
+
+
+def findall(env, doctree, condition):
+    # Like doctree.findall but also looks inside referenced global values for when they are needed before writing (eg
+    # collecting from the doctree when reading). Yields the found node and the node in the doctree it is from.
+    for node in doctree.findall(lambda node: isinstance(node, (variable, condition))):
+        if isinstance(node, variable):
+            value = env.variable_globals.get(node["key"])
+            for found in value.findall(condition) if value is not None else []:
+                yield found, node
         else:
+            yield node, node
+
+
+BRACE_PATTERN = re.compile(r"\{([^{}]+)\}")
+
+# Expanded text of stored values. Values are never mutated once set so this is only computed once per value.
+text_cache = weakref.WeakKeyDictionary()
+
+
+def lookup(dictionary, key):
+    try:
+        return dictionary[key]
+    except KeyError:
+        raise ValueError(f"Unknown variable: {key}") from None
+
+
+def variable_text(dictionary, key):
+    node = lookup(dictionary, key)
+    if node not in text_cache:
+        text_cache[node] = node[0].astext()
+    return text_cache[node]
+
+
+def brace_substitution_text(dictionary, text):
+    # Values are expanded when they are set so the text of a value never contains braces. There cannot be cycles as a
+    # value can only refer to what was set before it.
+    return BRACE_PATTERN.sub(lambda match: variable_text(dictionary, match.group(1)), text)
+
+
+def brace_substitution_node(dictionary, text):
+    # Text substitution outputting as nodes for the text content. Also uses braces. We do NOT support nested braces.
+    node_list = []
+    position = 0
+    for match in BRACE_PATTERN.finditer(text):
+        if match.start() > position:
             # This part will be just text so created a node.
+            part = text[position:match.start()]
             node_list += nodes.inline(part, part)
+        node_list += value_nodes(dictionary, match.group(1))
+        position = match.end()
+    if position < len(text):
+        part = text[position:]
+        node_list += nodes.inline(part, part)
     return node_list
@@ -1,8 +1,23 @@
+import re
 from docutils import nodes
-from docutils.parsers.rst import Directive
 from sphinx import addnodes
+from sphinx.util.docutils import SphinxDirective
+
+# Video IDs are 11 characters of URL safe base64.
+ID_PATTERN = re.compile(r"^[A-Za-z0-9_-]{11}$")
+
+# A thumbnail which is swapped for the player when clicked (see custom.js) so the player is only downloaded when
+# wanted. The size is set so the page does not shift when the thumbnail loads.
+HTML_TEMPLATE = """
+    <div class="video-container youtube-facade">
+        <a href="{url}" data-youtube-id="{id}" aria-label="Play video">
+            <img class="no-zoom" src="https://i.ytimg.com/vi/{id}/hqdefault.jpg" width="480" height="360" loading="lazy" decoding="async" alt="">
+        </a>
+    </div>"""
+
+URL_TEMPLATE = "https://www.youtube.com/watch?v={id}"
 
-class YouTube(Directive):
+class YouTube(SphinxDirective):
 
     required_arguments = 1
 
@@ -10,15 +25,19 @@ class YouTube(Directive):
 
     def run(self):
         id = self.arguments[0]
+        if ID_PATTERN.match(id) is None:
+            raise self.error(f"Invalid YouTube video ID: {id!r} (expected the 11 characters after watch?v=)")
 
         [only_html, only_pdf] = youtube_embed(id)
 
         # TODO: should we skip figure if no caption?
         figure_node = nodes.figure("")
+        self.set_source_info(figure_node)
 
         figure_node += only_html
         figure_node += only_pdf
 
+        messages = []
         has_caption = len(self.content) > 0
 
         if has_caption:
@@ -27,28 +46,21 @@ class YouTube(Directive):
             caption_node = nodes.caption(caption, '', *inodes)
             figure_node += caption_node
 
-        return [figure_node]
-        # return [only_html, only_pdf]
+        return [figure_node, *messages]
 
 def youtube_embed(id):
-    html = f"""
-    <div class="video-container">
-        <iframe width="100%" height="100%" src="https://www.youtube-nocookie.com/embed/{id}" frameborder="0" allow="accelerometer; autoplay; clipboard-write; encrypted-media; gyroscope; picture-in-picture" allowfullscreen>
-        </iframe>
-    </div>"""
+    url = URL_TEMPLATE.format(id=id)
 
     # Add only HTML node.
-    only_html = addnodes.only(expr="html")
-
-    text = "https://www.youtube.com/watch?v={id}"
+    only_html = addnodes.only(expr="html and not offline")
 
     # Add YouTube HTML to only node.
-    only_html += nodes.raw(text=html, format="html")
+    only_html += nodes.raw(text=HTML_TEMPLATE.format(id=id, url=url), format="html")
 
     # Add fallback for PDFs.
-    only_pdf = addnodes.only(expr="latex")
+    only_pdf = addnodes.only(expr="latex or offline")
     # TODO: add optional fallback text
-    only_pdf += nodes.paragraph(text=f"https://www.youtube.com/watch?v={id}")
+    only_pdf += nodes.paragraph(text=url)
 
     return [only_html, only_pdf]
 
@@ -0,0 +1,286 @@
+#!/usr/bin/env python3
+
+# Checks the variables, labels and only expressions without building, so mistakes are found in well under a second
+# rather than after a full build (eg in CI before building):
+#   - Every get (including the default role), link and brace substitution refers to a variable set before it, either
+#     in variables_prolog or earlier in the document or its includes.
+#   - Labels (eg `[URP]`) are variables and name a known tag.
+#   - Only expressions parse and name known tags.
+#
+# The sources are scanned as text so this is not a full reStructuredText parser. It follows the same rules as
+# extensions/variables.py for what can be used where.
+#
+# Usage: make lint (or python3 lint.py [-j N] [files ...])
+
+import argparse
+import os
+import re
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+SOURCE_DIRECTORY = os.path.dirname(os.path.abspath(__file__))
+CONFIG_PATH = os.path.join(SOURCE_DIRECTORY, "conf.py")
+MAKEFILE_PATH = os.path.join(SOURCE_DIRECTORY, "Makefile")
+EXTENSIONS_DIRECTORY = os.path.join(SOURCE_DIRECTORY, "extensions")
+sys.path.insert(0, EXTENSIONS_DIRECTORY)
+
+from sphinx.util.matching import Matcher
+from sphinx.util.tags import Tags
+from tags import compile_condition
+
+# Tags conf.py and the extensions check or set (eg tags.has("offline")), and those the Makefile passes (eg -t no-tabs).
+TAG_USE_PATTERN = re.compile(r"""\btags\.(?:has|add)\(\s*["']([\w-]+)["']""")
+MAKEFILE_TAG_PATTERN = re.compile(r"\s-t\s+([\w-]+)")
+
+
+def get_project_tags():
+    tags = set()
+    paths = [CONFIG_PATH] + [os.path.join(EXTENSIONS_DIRECTORY, x) for x in sorted(os.listdir(EXTENSIONS_DIRECTORY))]
+    for path in paths:
+        if not path.endswith(".py"):
+            continue
+        with open(path, encoding="utf-8") as file:
+            for line in file:
+                if not line.lstrip().startswith("#"):
+                    tags.update(TAG_USE_PATTERN.findall(line))
+    with open(MAKEFILE_PATH, encoding="utf-8") as file:
+        tags.update(MAKEFILE_TAG_PATTERN.findall(file.read()))
+    return tags
+
+
+# Tags set by Sphinx for the builders (eg html and format_latex) are added to these.
+PROJECT_TAGS = get_project_tags()
+BUILDERS = {
+    "html": "html", "dirhtml": "html", "singlehtml": "html", "epub": "html", "latex": "latex", "text": "text",
+    "man": "man", "texinfo": "texinfo", "xml": "xml", "pseudoxml": "pseudoxml", "dummy": "", "linkcheck": "",
+}
+KNOWN_TAGS = PROJECT_TAGS | set(BUILDERS) | {f"builder_{x}" for x in BUILDERS} | {
+    f"format_{x}" for x in BUILDERS.values() if x
+}
+
+# Directives whose content is not reStructuredText.
+LITERAL_DIRECTIVES = {"raw", "code-block", "code", "sourcecode", "literalinclude", "math", "csv-table"}
+# Directives whose argument is inline text (eg a title).
+INLINE_ARGUMENT_DIRECTIVES = {"admonition", "dropdown", "tab", "grid-item-card", "rubric", "topic", "sidebar"}
+
+DIRECTIVE_PATTERN = re.compile(r"^(\s*)\.\.\s+([\w:-]+)::(?:\s+(.*))?$")
+COMMENT_PATTERN = re.compile(r"^(\s*)\.\.(?:\s+(?![_|\[]).*)?$")
+OPTION_PATTERN = re.compile(r"^\s+:[\w-]+:")
+INLINE_LITERAL_PATTERN = re.compile(r"``.+?``", re.DOTALL)
+# Interpreted text with an optional role, but not hyperlink references (eg `Text <url>`_). Uses the characters docutils
+# allows around inline markup.
+INTERPRETED_PATTERN = re.compile(
+    r"(?<![^\s'\"(\[{<\-/:])(?::([\w.+-]+):)?`(?=\S)((?:[^`\\]|\\.)+?)(?<=\S)`(?![^\s'\")\]}>\-/:.,;!?\\])"
+)
+BRACE_PATTERN = re.compile(r"\{([^{}]+)\}")
+
+
+class Linter:
+    def __init__(self, globals):
+        self.globals = globals
+        self.diagnostics = []
+
+    def error(self, path, line, message):
+        self.diagnostics.append((path, line, message))
+
+    def check_condition(self, path, line, condition, what):
+        try:
+            compile_condition(condition)
+        except Exception as error:
+            self.error(path, line, f"invalid {what} {condition!r}: {str(error).splitlines()[0]}")
+            return
+        # Names are checked separately as an unknown tag is only ever false.
+        for name in re.findall(r"[A-Za-z_][\w]*", condition):
+            if name not in ("and", "or", "not", "true", "false", "True", "False") and name not in KNOWN_TAGS:
+                self.error(path, line, f"unknown tag {name!r} in {what} {condition!r}")
+
+    def check_key(self, path, line, variables, key):
+        if key not in variables and key not in self.globals:
+            self.error(path, line, f"unknown variable: {key}")
+
+    def check_braces(self, path, line, variables, text):
+        for match in BRACE_PATTERN.finditer(text):
+            self.check_key(path, line, variables, match.group(1))
+
+    def check_inline(self, path, line, variables, text):
+        # Inline literals can contain anything so are blanked, keeping the offsets for line numbers.
+        text = INLINE_LITERAL_PATTERN.sub(lambda match: re.sub(r"[^\n]", " ", match.group(0)), text)
+        for match in INTERPRETED_PATTERN.finditer(text):
+            role, content = match.group(1) or "get", match.group(2)
+            match_line = line + text.count("\n", 0, match.start())
+            if role == "get":
+                self.check_get(path, match_line, variables, " ".join(content.split()))
+            elif role == "link":
+                if " <" not in content or not content.rstrip().endswith(">"):
+                    self.error(path, match_line, f"link must be :link:`Text <URL>`: {content!r}")
+                self.check_braces(path, match_line, variables, content)
+
+    def check_get(self, path, line, variables, text):
+        # Same as VariableRole.
+        keys = text.split()
+        if not keys:
+            self.error(path, line, "empty get")
+        elif not keys[0].startswith("["):
+            self.check_key(path, line, variables, keys[0])
+        elif keys[0].startswith("[[") and keys[0].endswith("]]"):
+            self.check_key(path, line, variables, keys[0][1:-1])
+        else:
+            for key in keys:
+                if not (key.startswith("[") and key.endswith("]")):
+                    self.error(path, line, f"label must be in brackets: {key}")
+                    continue
+                self.check_key(path, line, variables, key)
+                self.check_condition(path, line, key[1:-1].lower(), "label")
+
+    def check_set(self, path, line, variables, text):
+        if " " not in text.strip():
+            self.error(path, line, f"set needs a key and a value: {text!r}")
+            return
+        key, value = text.strip().split(" ", 1)
+        self.check_braces(path, line, variables, value)
+        # Braces are substituted with text before the value is parsed.
+        self.check_inline(path, line, variables, BRACE_PATTERN.sub("x", value))
+        variables.add(key)
+
+    def check_file(self, path, variables, including=()):
+        if path in including:
+            self.error(path, 0, "include loop")
+            return
+        try:
+            with open(path, encoding="utf-8") as file:
+                lines = file.read().splitlines()
+        except OSError as error:
+            self.error(including[-1] if including else path, 0, f"cannot read {path}: {error}")
+            return
+
+        # Lines indented more than this are skipped (eg literal blocks and comments).
+        skip_indent = None
+        paragraph = []
+
+        def flush():
+            if paragraph:
+                self.check_inline(path, paragraph[0][0], variables, "\n".join(x[1] for x in paragraph))
+                paragraph.clear()
+
+        for number, text in enumerate(lines, 1):
+            indent = len(text) - len(text.lstrip())
+            if skip_indent is not None:
+                if not text.strip() or indent > skip_indent:
+                    continue
+                skip_indent = None
+
+            if not text.strip():
+                flush()
+                continue
+
+            directive = DIRECTIVE_PATTERN.match(text)
+            if directive is not None:
+                flush()
+                name, argument = directive.group(2), (directive.group(3) or "").strip()
+                if name == "set":
+                    self.check_set(path, number, variables, argument)
+                elif name == "only":
+                    self.check_condition(path, number, argument, "only expression")
+                elif name == "include":
+                    directory = SOURCE_DIRECTORY if argument.startswith("/") else os.path.dirname(path)
+                    included = os.path.normpath(os.path.join(directory, argument.lstrip("/")))
+                    self.check_file(included, variables, including + (path,))
+                elif name in LITERAL_DIRECTIVES:
+                    skip_indent = indent
+                elif name in INLINE_ARGUMENT_DIRECTIVES:
+                    self.check_inline(path, number, variables, argument)
+                continue
+
+            if COMMENT_PATTERN.match(text) or (paragraph == [] and OPTION_PATTERN.match(text)):
+                flush()
+                if COMMENT_PATTERN.match(text):
+                    skip_indent = indent
+                continue
+
+            paragraph.append((number, text))
+            # A paragraph ending with :: starts a literal block.
+            if text.rstrip().endswith("::"):
+                flush()
+                skip_indent = indent
+        flush()
+
+
+def load_config():
+    namespace = {"__file__": CONFIG_PATH, "tags": Tags()}
+    with open(CONFIG_PATH, encoding="utf-8") as file:
+        source = file.read()
+    exec(compile(source, CONFIG_PATH, "exec"), namespace)
+    return namespace, source
+
+
+def read_globals(config, source):
+    # Same order as read_global_variables so a value can only use those set before it.
+    linter = Linter(set())
+    variables = set()
+    for text in config.get("variables_prolog", "").splitlines():
+        directive = DIRECTIVE_PATTERN.match(text)
+        if directive is None or directive.group(2) != "set":
+            continue
+        # The prolog is a string in conf.py so the line is where the text appears.
+        index = source.find(text.strip())
+        line = source.count("\n", 0, index) + 1 if index >= 0 else 0
+        linter.check_set(CONFIG_PATH, line, variables, (directive.group(3) or "").strip())
+    return variables, linter.diagnostics
+
+
+def find_documents(config):
+    matcher = Matcher(config.get("exclude_patterns", []))
+    documents = []
+    for root, directories, files in os.walk(SOURCE_DIRECTORY):
+        def get_relative(name):
+            return os.path.relpath(os.path.join(root, name), SOURCE_DIRECTORY).replace(os.sep, "/")
+
+        # Excluded directories (eg includes) are only checked where they are included.
+        directories[:] = sorted(x for x in directories if not x.startswith(".") and not matcher(get_relative(x)))
+        for name in sorted(files):
+            if name.endswith(".rst") and not matcher(get_relative(name)):
+                documents.append(os.path.join(root, name))
+    return documents
+
+
+def check_documents(globals, paths):
+    linter = Linter(globals)
+    for path in paths:
+        linter.check_file(path, set())
+    return linter.diagnostics
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("-j", dest="jobs", default="auto", help="number of processes, or auto")
+    parser.add_argument("files", nargs="*", help="documents to check (default all)")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    config, source = load_config()
+    globals, diagnostics = read_globals(config, source)
+    documents = [os.path.abspath(x) for x in args.files] or find_documents(config)
+
+    jobs = (os.cpu_count() or 1) if args.jobs == "auto" else int(args.jobs)
+    jobs = min(jobs, len(documents))
+    if jobs > 1:
+        chunks = [documents[x::jobs] for x in range(jobs)]
+        with ProcessPoolExecutor(jobs) as executor:
+            for result in executor.map(check_documents, [globals] * jobs, chunks):
+                diagnostics += result
+    else:
+        diagnostics += check_documents(globals, documents)
+
+    for path, line, message in sorted(set(diagnostics)):
+        print(f"{os.path.relpath(path)}:{line}: {message}")
+    print(
+        f"checked {len(documents)} documents and {len(globals)} global variables in "
+        f"{(time.perf_counter() - start) * 1000:.0f} ms: {len(set(diagnostics))} problems",
+        file=sys.stderr,
+    )
+    return 1 if diagnostics else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
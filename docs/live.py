@@ -0,0 +1,127 @@
+#!/usr/bin/env python3
+
+# Development server with live reload. Unlike sphinx-autobuild, Sphinx and the build environment are kept in memory
+# between builds so a save only reads the changed documents and their dependents (eg includes or documents using a
+# changed global variable), writes the affected pages and reloads the browser.
+#
+# Usage: make live (or python3 live.py [-p port] [--host host] [sphinx-build options])
+#
+# sphinx-build options (eg -t, -j, -D, -W, -E, -n and -q) are used for every build. The builder and directories are
+# always those of "make html".
+#
+# Changes to conf.py or the extensions restart the server as Sphinx cannot be set up twice in the same process. The
+# environment is then loaded from disk as usual.
+
+import argparse
+import os
+import sys
+import time
+from livereload import Server
+from sphinx.application import Sphinx
+from sphinx.cmd.build import get_parser
+from sphinx.util.console import nocolor
+
+SOURCE_DIRECTORY = os.path.dirname(os.path.abspath(__file__))
+BUILD_DIRECTORY = os.path.join(SOURCE_DIRECTORY, "_build")
+# Same as "make html" so either can continue from the other.
+OUTPUT_DIRECTORY = os.path.join(BUILD_DIRECTORY, "html")
+DOCTREE_DIRECTORY = os.path.join(BUILD_DIRECTORY, "doctrees")
+CONFIG_PATH = os.path.join(SOURCE_DIRECTORY, "conf.py")
+EXTENSIONS_DIRECTORY = os.path.join(SOURCE_DIRECTORY, "extensions")
+
+
+class LiveBuilder:
+    def __init__(self, args):
+        self.args = args
+        self.app = None
+        self.failed = False
+
+    def create(self):
+        args = self.args
+        self.app = Sphinx(
+            SOURCE_DIRECTORY,
+            SOURCE_DIRECTORY,
+            OUTPUT_DIRECTORY,
+            DOCTREE_DIRECTORY,
+            "html",
+            # Minifying and compressing are not worth the time as the browser is local (see extensions/compress.py).
+            confoverrides={"compress_minify": False, "compress_formats": [], **args.confoverrides},
+            status=None if args.quiet or args.really_quiet else sys.stdout,
+            warning=None if args.really_quiet else sys.stderr,
+            freshenv=args.freshenv,
+            warningiserror=args.warningiserror,
+            tags=args.tags,
+            verbosity=args.verbosity,
+            parallel=args.jobs,
+            keep_going=True,
+        )
+
+    def build(self, path=None):
+        if path is not None:
+            path = os.path.abspath(path)
+            if self.failed or path == CONFIG_PATH or path.startswith(EXTENSIONS_DIRECTORY + os.sep):
+                print(f"{path} changed, restarting")
+                os.execv(sys.executable, [sys.executable] + sys.argv)
+
+        start = time.perf_counter()
+        try:
+            if self.app is None:
+                self.create()
+            # Only the first build (-a).
+            self.app.build(self.args.force_all and path is None)
+        except Exception as error:
+            # The environment may be half updated so start again from what is on disk after the next change.
+            self.failed = True
+            print(f"build failed: {error!r}")
+            return
+        # Eg with -W.
+        problems = " with problems" if self.app.statuscode else ""
+        print(f"built{problems} in {time.perf_counter() - start:.2f}s")
+
+
+def parse_sphinx_arguments(parser, argv):
+    # Same handling as sphinx-build, with the directories of "make html".
+    sphinx_parser = get_parser()
+    args = sphinx_parser.parse_args([SOURCE_DIRECTORY, OUTPUT_DIRECTORY] + argv)
+    if args.builder != "html" or args.filenames or args.doctreedir or args.confdir or args.noconfig or args.warnfile:
+        parser.error("-b, -d, -c, -C, -w and file names are not supported")
+
+    args.confoverrides = {}
+    for value in args.define:
+        key, separator, value = value.partition("=")
+        if not separator:
+            parser.error("-D option argument must be in the form name=value")
+        args.confoverrides[key] = value
+    for value in args.htmldefine:
+        key, separator, value = value.partition("=")
+        if not separator:
+            parser.error("-A option argument must be in the form name=value")
+        args.confoverrides[f"html_context.{key}"] = int(value) if value.isdigit() else value
+    if args.nitpicky:
+        args.confoverrides["nitpicky"] = True
+    return args
+
+
+def main():
+    parser = argparse.ArgumentParser(epilog="Other options are passed on to Sphinx (see sphinx-build --help).")
+    parser.add_argument("-p", "--port", type=int, default=8000)
+    parser.add_argument("--host", default="localhost")
+    args, sphinx_argv = parser.parse_known_args()
+    sphinx_args = parse_sphinx_arguments(parser, sphinx_argv)
+
+    if sphinx_args.color == "no" or (sphinx_args.color == "auto" and not sys.stdout.isatty()):
+        nocolor()
+
+    builder = LiveBuilder(sphinx_args)
+    builder.build()
+
+    server = Server()
+    server.watcher.ignore_dirs("_build", "__pycache__")
+    server.watch(SOURCE_DIRECTORY, lambda: builder.build(server.watcher.filepath))
+    # Files outside of the docs which are included.
+    server.watch(os.path.join(SOURCE_DIRECTORY, "..", "CONTRIBUTING.md"), lambda: builder.build(server.watcher.filepath))
+    server.serve(root=OUTPUT_DIRECTORY, host=args.host, port=args.port, open_url_delay=None)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,153 @@
+#!/usr/bin/env python3
+
+# Compiles the LaTeX written for each pipeline (eg by "make pdf-write-urp") into PDFs, with the pipelines compiled at
+# the same time, and reuses a previous PDF when nothing it is compiled from has changed:
+#   - The .tex file, images and support files written by Sphinx are hashed. If there is a PDF for the same hash in
+#     _build/pdf-cache it is used as is instead of running latexmk (several LaTeX passes).
+#   - Each pipeline is compiled in its own build directory (eg _build/pdf-urp/latex) with the output of latexmk written
+#     to latexmk.log there, so they do not interleave.
+#   - PDFs are copied into place through a temporary file and a rename, so a parallel run or Unity never sees a partial
+#     file.
+#
+# Usage: make pdf (or python3 pdf.py [--install pipeline] pipelines ...)
+
+import argparse
+import hashlib
+import os
+import shutil
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+SOURCE_DIRECTORY = os.path.dirname(os.path.abspath(__file__))
+BUILD_DIRECTORY = os.path.join(SOURCE_DIRECTORY, "_build")
+CACHE_DIRECTORY = os.path.join(BUILD_DIRECTORY, "pdf-cache")
+# The Unity package includes the user guide for one pipeline.
+INSTALL_PATH = os.path.join(SOURCE_DIRECTORY, "..", "crest", "Assets", "Crest", "userguide.pdf")
+
+PIPELINES = ("birp", "urp", "hdrp")
+# Same as latex_documents.
+DOCUMENT = "crest"
+# Options which change the output without changing the files.
+ENVIRONMENT = ("LATEXOPTS", "LATEXMKOPTS")
+# Lines of latexmk.log shown when it fails.
+LOG_LINES = 30
+
+
+def get_latex_directory(pipeline):
+    return os.path.join(BUILD_DIRECTORY, f"pdf-{pipeline}", "latex")
+
+
+def get_make():
+    # Same as "sphinx-build -M latexpdf" so the engine and options from latexmkrc are used.
+    return os.environ.get("MAKE", "make.bat" if sys.platform == "win32" else "make")
+
+
+def get_digest(directory):
+    digest = hashlib.sha1()
+    for name in ENVIRONMENT:
+        digest.update(f"{name}={os.environ.get(name, '')}\n".encode("utf-8"))
+    for root, directories, files in os.walk(directory):
+        directories.sort()
+        for file_name in sorted(files):
+            # Written by latexmk (eg crest.aux and crest.pdf) rather than Sphinx.
+            stem, _, ext = file_name.partition(".")
+            if (root == directory and stem == DOCUMENT and ext != "tex") or ext == "log":
+                continue
+            path = os.path.join(root, file_name)
+            with open(path, "rb") as file:
+                content = hashlib.sha1(file.read()).hexdigest()
+            digest.update(f"{os.path.relpath(path, directory)}:{content}\n".encode("utf-8"))
+    return digest.hexdigest()
+
+
+def is_same(path, other_path):
+    if not os.path.isfile(path) or not os.path.isfile(other_path):
+        return False
+    if os.path.getsize(path) != os.path.getsize(other_path):
+        return False
+    with open(path, "rb") as file, open(other_path, "rb") as other_file:
+        return file.read() == other_file.read()
+
+
+def copy_atomic(source, destination):
+    # In the same directory so the rename is atomic, and unique so parallel runs do not share it.
+    temporary_path = f"{destination}.{os.getpid()}.{threading.get_ident()}.tmp"
+    try:
+        shutil.copyfile(source, temporary_path)
+        os.replace(temporary_path, destination)
+    finally:
+        if os.path.exists(temporary_path):
+            os.remove(temporary_path)
+
+
+def build(pipeline):
+    start = time.perf_counter()
+    directory = get_latex_directory(pipeline)
+    if not os.path.isfile(os.path.join(directory, f"{DOCUMENT}.tex")):
+        return f"{directory} has no {DOCUMENT}.tex, run make pdf-write-{pipeline} first"
+
+    digest = get_digest(directory)
+    cached_path = os.path.join(CACHE_DIRECTORY, f"{DOCUMENT}-{pipeline}-{digest[:16]}.pdf")
+    status = "unchanged"
+    if not os.path.isfile(cached_path):
+        log_path = os.path.join(directory, "latexmk.log")
+        with open(log_path, "w", encoding="utf-8") as log:
+            try:
+                returncode = subprocess.call([get_make(), "all-pdf"], cwd=directory, stdout=log, stderr=log)
+            except OSError as error:
+                return f"failed to run {get_make()}: {error}"
+        if returncode != 0:
+            with open(log_path, encoding="utf-8", errors="replace") as log:
+                lines = log.read().splitlines()[-LOG_LINES:]
+            return "\n".join([f"latexmk failed (see {log_path}):"] + lines)
+
+        os.makedirs(CACHE_DIRECTORY, exist_ok=True)
+        copy_atomic(os.path.join(directory, f"{DOCUMENT}.pdf"), cached_path)
+        # Only the latest for each pipeline is kept.
+        for file_name in os.listdir(CACHE_DIRECTORY):
+            path = os.path.join(CACHE_DIRECTORY, file_name)
+            if file_name.startswith(f"{DOCUMENT}-{pipeline}-") and file_name.endswith(".pdf") and path != cached_path:
+                os.remove(path)
+        status = "compiled"
+
+    destination = os.path.join(BUILD_DIRECTORY, f"{DOCUMENT}-{pipeline}.pdf")
+    if not is_same(cached_path, destination):
+        copy_atomic(cached_path, destination)
+    print(f"{pipeline}: {status} in {time.perf_counter() - start:.1f}s -> {os.path.relpath(destination)}")
+    return None
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("pipelines", nargs="+", choices=PIPELINES)
+    parser.add_argument("--install", choices=PIPELINES, help="copy this pipeline's PDF into the Unity package")
+    args = parser.parse_args()
+
+    pipelines = list(dict.fromkeys(args.pipelines))
+    with ThreadPoolExecutor(len(pipelines)) as executor:
+        errors = dict(zip(pipelines, executor.map(build, pipelines)))
+
+    failed = False
+    for pipeline, error in errors.items():
+        if error is not None:
+            print(f"{pipeline}: {error}", file=sys.stderr)
+            failed = True
+
+    if args.install is not None and errors.get(args.install, "not built") is None:
+        source = os.path.join(BUILD_DIRECTORY, f"{DOCUMENT}-{args.install}.pdf")
+        # Left alone when unchanged so Unity does not import it again.
+        if not is_same(source, INSTALL_PATH):
+            copy_atomic(source, INSTALL_PATH)
+            print(f"installed {args.install} -> {os.path.relpath(INSTALL_PATH)}")
+    elif args.install is not None:
+        print(f"not installing {args.install} as it was not built", file=sys.stderr)
+        failed = True
+
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
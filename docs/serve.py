@@ -0,0 +1,175 @@
+#!/usr/bin/env python3
+
+# Static server for the HTML output which behaves like a production host so the page weight and caching seen locally
+# are what visitors get:
+#   - Serves the precompressed copies written by extensions/compress.py (Brotli or gzip) when the browser accepts them.
+#   - Sets ETag and Cache-Control, and answers conditional requests with 304. Files listed in _headers (the
+#     fingerprinted static files) are cached forever, everything else is revalidated.
+#   - Supports range requests (served uncompressed).
+#
+# Usage: make serve (or python3 serve.py [-p port] [-d directory])
+
+import argparse
+import email.utils
+import os
+import re
+import sys
+import urllib.parse
+from functools import partial
+from http import HTTPStatus
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+
+SOURCE_DIRECTORY = os.path.dirname(os.path.abspath(__file__))
+# Same as "make html".
+OUTPUT_DIRECTORY = os.path.join(SOURCE_DIRECTORY, "_build", "html")
+
+# In order of preference.
+ENCODINGS = (("br", ".br"), ("gzip", ".gz"))
+
+DEFAULT_CACHE_CONTROL = "no-cache"
+
+RANGE_PATTERN = re.compile(r"^bytes=(\d*)-(\d*)$")
+
+
+def read_headers(path):
+    # Netlify style: a path, then its headers indented on the following lines.
+    headers = {}
+    url = None
+    with open(path, encoding="utf-8") as file:
+        for line in file:
+            if not line.strip() or line.lstrip().startswith("#"):
+                continue
+            if not line[0].isspace():
+                url = line.strip()
+                continue
+            name, _, value = line.strip().partition(":")
+            headers.setdefault(url, {})[name.strip()] = value.strip()
+    return headers
+
+
+def get_accepted_encodings(header):
+    accepted = set()
+    for part in (header or "").split(","):
+        name, _, parameters = part.strip().partition(";")
+        quality = re.search(r"q=([\d.]+)", parameters)
+        if name and (quality is None or float(quality.group(1)) > 0):
+            accepted.add(name.strip().lower())
+    return accepted
+
+
+class RequestHandler(SimpleHTTPRequestHandler):
+    # Keep connections open like a production host.
+    protocol_version = "HTTP/1.1"
+    # Read again when a build changes it.
+    headers_cache = (None, {})
+
+    def get_headers(self, url):
+        path = os.path.join(self.directory, "_headers")
+        mtime = os.stat(path).st_mtime_ns if os.path.exists(path) else None
+        if RequestHandler.headers_cache[0] != mtime:
+            RequestHandler.headers_cache = (mtime, read_headers(path) if mtime is not None else {})
+        return RequestHandler.headers_cache[1].get(url, {})
+
+    def send_head(self):
+        path = self.translate_path(self.path)
+        if os.path.isdir(path):
+            if not self.path.split("?")[0].endswith("/"):
+                # Same as SimpleHTTPRequestHandler.
+                return super().send_head()
+            path = os.path.join(path, "index.html")
+        if not os.path.isfile(path):
+            self.send_error(HTTPStatus.NOT_FOUND, "File not found")
+            return None
+
+        content_type = self.guess_type(path)
+        requested_range = self.headers.get("Range")
+        encoding = None
+        if requested_range is None:
+            accepted = get_accepted_encodings(self.headers.get("Accept-Encoding"))
+            for name, suffix in ENCODINGS:
+                if name in accepted and os.path.isfile(path + suffix):
+                    encoding, path = name, path + suffix
+                    break
+
+        stat = os.stat(path)
+        etag = f'"{stat.st_mtime_ns:x}-{stat.st_size:x}{"-" + encoding if encoding else ""}"'
+        url = urllib.parse.unquote(urllib.parse.urlsplit(self.path).path)
+        headers = {"Cache-Control": DEFAULT_CACHE_CONTROL, **self.get_headers(url)}
+
+        def send_common_headers():
+            self.send_header("ETag", etag)
+            self.send_header("Last-Modified", email.utils.formatdate(stat.st_mtime, usegmt=True))
+            self.send_header("Vary", "Accept-Encoding")
+            for name, value in headers.items():
+                self.send_header(name, value)
+
+        if etag in [x.strip() for x in self.headers.get("If-None-Match", "").split(",")]:
+            self.send_response(HTTPStatus.NOT_MODIFIED)
+            send_common_headers()
+            self.end_headers()
+            return None
+
+        start, end = 0, stat.st_size - 1
+        status = HTTPStatus.OK
+        if requested_range is not None and self.headers.get("If-Range", etag) == etag:
+            match = RANGE_PATTERN.match(requested_range.strip())
+            if match is not None and match.group(1) + match.group(2) != "":
+                if match.group(1) == "":
+                    start = max(0, stat.st_size - int(match.group(2)))
+                else:
+                    start = int(match.group(1))
+                    end = min(end, int(match.group(2))) if match.group(2) else end
+                if start > end:
+                    self.send_response(HTTPStatus.REQUESTED_RANGE_NOT_SATISFIABLE)
+                    self.send_header("Content-Range", f"bytes */{stat.st_size}")
+                    self.send_header("Content-Length", "0")
+                    self.end_headers()
+                    return None
+                status = HTTPStatus.PARTIAL_CONTENT
+
+        file = open(path, "rb")
+        file.seek(start)
+        self.remaining = end - start + 1
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(self.remaining))
+        self.send_header("Accept-Ranges", "bytes")
+        if status == HTTPStatus.PARTIAL_CONTENT:
+            self.send_header("Content-Range", f"bytes {start}-{end}/{stat.st_size}")
+        if encoding is not None:
+            self.send_header("Content-Encoding", encoding)
+        send_common_headers()
+        self.end_headers()
+        return file
+
+    def copyfile(self, source, outputfile):
+        # Only what was asked for when it is a range.
+        while self.remaining > 0:
+            data = source.read(min(64 * 1024, self.remaining))
+            if not data:
+                break
+            outputfile.write(data)
+            self.remaining -= len(data)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("-p", "--port", type=int, default=8000)
+    parser.add_argument("--host", default="localhost")
+    parser.add_argument("-d", "--directory", default=OUTPUT_DIRECTORY)
+    args = parser.parse_args()
+
+    if not os.path.isdir(args.directory):
+        sys.exit(f"{args.directory} does not exist, run make html first")
+
+    handler = partial(RequestHandler, directory=args.directory)
+    with ThreadingHTTPServer((args.host, args.port), handler) as server:
+        print(f"http://{args.host}:{args.port}")
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+
+
+if __name__ == "__main__":
+    main()
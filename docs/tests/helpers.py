@@ -0,0 +1,43 @@
+import io
+import os
+import sys
+from sphinx.application import Sphinx
+from sphinx.util.console import nocolor
+
+EXTENSIONS_DIRECTORY = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "extensions")
+sys.path.insert(0, EXTENSIONS_DIRECTORY)
+
+
+def write(directory, name, text):
+    path = os.path.join(directory, name)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w", encoding="utf-8") as file:
+        file.write(text)
+
+
+def build(directory, extensions, tags=(), **config):
+    # Fragments to include go in "inc".
+    config = {"extensions": extensions, "exclude_patterns": ["_build", "inc"], **config}
+    write(directory, "conf.py", "".join(f"{key} = {value!r}\n" for key, value in config.items()))
+    nocolor()
+    warnings = io.StringIO()
+    app = Sphinx(
+        directory,
+        directory,
+        os.path.join(directory, "_build", "html"),
+        os.path.join(directory, "_build", "doctrees"),
+        "html",
+        status=None,
+        warning=warnings,
+        freshenv=True,
+        tags=list(tags),
+    )
+    app.build()
+    return warnings.getvalue()
+
+
+def read_body(directory, name):
+    # Without the navigation, which links to every page.
+    with open(os.path.join(directory, "_build", "html", name), encoding="utf-8") as file:
+        text = file.read()
+    return text[text.index('<div class="body"'):text.index('<div class="sphinxsidebar"')]
@@ -0,0 +1,97 @@
+import asyncio
+import socket
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import pytest
+import helpers  # noqa: F401
+# After helpers, which adds the extensions to the path.
+from checklinks import check_urls
+
+
+class Handler(BaseHTTPRequestHandler):
+    def do_HEAD(self):
+        self.respond()
+
+    def do_GET(self):
+        self.respond()
+
+    def respond(self):
+        requests = self.server.requests
+        requests[self.path] = requests.get(self.path, 0) + 1
+        if self.path == "/redirect":
+            self.send_response(301)
+            self.send_header("Location", "/ok")
+        elif self.path == "/no-head" and self.command == "HEAD":
+            self.send_response(405)
+        elif self.path == "/rate-limited" and requests[self.path] == 1:
+            self.send_response(429)
+            self.send_header("Retry-After", "0")
+        elif self.path == "/missing":
+            self.send_response(404)
+        else:
+            self.send_response(200)
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def server():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    server.requests = {}
+    server.url = f"http://127.0.0.1:{server.server_address[1]}"
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def get_closed_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def test_statuses(server):
+    refused = f"http://127.0.0.1:{get_closed_port()}/"
+    urls = [f"{server.url}/{x}" for x in ("ok", "redirect", "no-head", "rate-limited", "missing")] + [refused]
+
+    results = check_urls(urls, timeout=5)
+
+    assert {url: result["status"] for url, result in results.items()} == {
+        f"{server.url}/ok": "working",
+        f"{server.url}/redirect": "redirected",
+        f"{server.url}/no-head": "working",
+        f"{server.url}/rate-limited": "working",
+        f"{server.url}/missing": "broken",
+        refused: "broken",
+    }
+    assert results[f"{server.url}/redirect"]["message"] == f"{server.url}/ok"
+    assert results[f"{server.url}/missing"]["code"] == 404
+    assert results[refused]["code"] == 0
+    # HEAD then GET, and one retry after the 429.
+    assert server.requests["/no-head"] == 2
+    assert server.requests["/rate-limited"] == 2
+
+
+def test_cache_expires(server, tmp_path):
+    cache_path = str(tmp_path / "checklinks.json")
+    urls = [f"{server.url}/ok", f"{server.url}/missing"]
+
+    check_urls(urls, cache_path=cache_path)
+    check_urls(urls, cache_path=cache_path, ttl=60)
+    assert server.requests == {"/ok": 1, "/missing": 1}
+
+    check_urls(urls, cache_path=cache_path, ttl=0)
+    assert server.requests == {"/ok": 2, "/missing": 2}
+
+
+def test_running_event_loop(server):
+    # Eg live.py, which builds from livereload's event loop.
+    async def check():
+        return check_urls([f"{server.url}/ok"])
+
+    assert asyncio.run(check())[f"{server.url}/ok"]["status"] == "working"
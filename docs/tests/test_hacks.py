@@ -0,0 +1,117 @@
+import random
+import pytest
+from helpers import build, read_body, write
+
+EXPRESSIONS = ("a", "b", "not a", "b or c", "a and not c")
+TAG_SETS = ((), ("a",), ("a", "b"), ("b", "c"), ("a", "b", "c"))
+DOCUMENTS = 30
+
+
+def generate(rng, depth=0):
+    # Lines of items (optionally followed by a paragraph, which is added to the last item), comments and only blocks.
+    segments = []
+    for _ in range(rng.randint(1, 4)):
+        kind = rng.choice(("items", "items", "comment", "only") if depth < 3 else ("items", "comment"))
+        if kind == "items":
+            segments.append(("items", rng.randint(1, 3), depth > 0 and rng.random() < 0.3))
+        elif kind == "comment":
+            segments.append(("comment",))
+        else:
+            segments.append(("only", rng.choice(EXPRESSIONS), generate(rng, depth + 1)))
+    return segments
+
+
+class Writer:
+    def __init__(self, marker):
+        self.marker = marker
+        self.count = 0
+
+    def write_items(self, segment, indent):
+        _, count, paragraph = segment
+        lines = []
+        for _ in range(count):
+            self.count += 1
+            lines.append(f"{indent}{self.marker}Item {self.count}")
+        lines.append("")
+        if paragraph:
+            lines += [f"{indent}Paragraph {self.count}.", ""]
+        return lines
+
+    def write_nested(self, segments, indent=""):
+        lines = []
+        for segment in segments:
+            if segment[0] == "items":
+                lines += self.write_items(segment, indent)
+            elif segment[0] == "comment":
+                lines += [f"{indent}.. Comment", ""]
+            else:
+                lines += [f"{indent}.. only:: {segment[1]}", ""] + self.write_nested(segment[2], indent + "   ")
+        return lines
+
+    def write_flat(self, segments, expr=None):
+        # The baseline only flattens one level so nested blocks are written as one with both conditions.
+        lines = []
+        for segment in segments:
+            if segment[0] == "items":
+                indent = "" if expr is None else "   "
+                if expr is not None:
+                    lines += [f".. only:: {expr}", ""]
+                lines += self.write_items(segment, indent)
+            elif segment[0] == "comment":
+                lines += [".. Comment", ""]
+            else:
+                lines += self.write_flat(segment[2], segment[1] if expr is None else f"({expr}) and ({segment[1]})")
+        return lines
+
+
+def write_documents(directory, block_type, marker, nested):
+    rng = random.Random(block_type)
+    names = []
+    for index in range(DOCUMENTS):
+        segments = generate(rng)
+        writer = Writer(marker)
+        lines = writer.write_nested(segments) if nested else writer.write_flat(segments)
+        name = f"{block_type}{index}"
+        write(directory, f"{name}.rst", "\n".join([f"{name}", "=" * len(name), "", f".. {block_type}::", ""]
+                                                 + [f"   {x}" if x else "" for x in lines]))
+        names.append(name)
+    return names
+
+
+@pytest.mark.parametrize("tags", TAG_SETS)
+def test_block_matches_baseline(tmp_path, tags):
+    bodies = {}
+    for extension, nested in (("hacks", True), ("baseline_hacks", False)):
+        directory = str(tmp_path / extension)
+        names = []
+        for block_type, marker in (("line_block", "| "), ("bullet_list", "- ")):
+            names += write_documents(directory, block_type, marker, nested)
+        write(directory, "index.rst", "Index\n=====\n\n.. toctree::\n\n" + "".join(f"   {x}\n" for x in names))
+        warnings = build(directory, [extension], tags)
+        assert "ERROR" not in warnings and "Exception" not in warnings
+        bodies[extension] = {x: read_body(directory, f"{x}.html") for x in names}
+
+    assert bodies["hacks"] == bodies["baseline_hacks"]
+
+
+@pytest.mark.parametrize("content", ["   Paragraph.\n\n   - Item\n", "   .. only:: a\n\n      Paragraph.\n\n   - Item\n"])
+def test_block_must_start_with_item(tmp_path, content):
+    directory = str(tmp_path)
+    write(directory, "index.rst", f"Index\n=====\n\n.. bullet_list::\n\n{content}")
+
+    warnings = build(directory, ["hacks"], ["a"])
+
+    assert "ERROR: The bullet_list directive must start with an item, not a paragraph" in warnings
+
+
+def test_nested_only_can_start_with_paragraph(tmp_path):
+    directory = str(tmp_path)
+    write(directory, "index.rst", "Index\n=====\n\n.. bullet_list::\n\n   - Item\n\n   .. only:: a\n\n      Paragraph.\n")
+
+    # Added to the item before the only block, and removed with the condition.
+    for tags, expected in ((["a"], True), ([], False)):
+        warnings = build(directory, ["hacks"], tags)
+        assert "ERROR" not in warnings
+        body = read_body(directory, "index.html")
+        assert ("<li><p>Item</p>\n<p>Paragraph.</p>" in body) is expected
+        assert ("Paragraph." in body) is expected
@@ -0,0 +1,51 @@
+import os
+import pytest
+from helpers import build, read_body, write
+# After helpers, which adds the extensions to the path.
+import includes
+
+
+@pytest.fixture(autouse=True)
+def clear_cache():
+    includes.cache.clear()
+    yield
+    includes.cache.clear()
+
+
+@pytest.mark.parametrize("extensions", [[], ["includes"]])
+def test_references_resolve_against_including_document(tmp_path, extensions):
+    # Only a/target exists so the reference from b/page must not resolve to it.
+    directory = str(tmp_path)
+    write(directory, "index.rst", "Index\n=====\n\n.. toctree::\n\n   a/page\n   a/target\n   b/page\n")
+    write(directory, "a/target.rst", "Target\n======\n")
+    write(directory, "inc/frag.rst", "See :doc:`target`.\n")
+    for name in ("a/page.rst", "b/page.rst"):
+        write(directory, name, "Page\n====\n\n.. include:: /inc/frag.rst\n")
+
+    warnings = build(directory, extensions)
+
+    assert 'href="target.html"' in read_body(directory, "a/page.html")
+    assert "target.html" not in read_body(directory, "b/page.html")
+    # Reported for b/page only, at the line in the fragment.
+    assert [x for x in warnings.splitlines() if "unknown document" in x] == [
+        f"{os.path.join(directory, 'inc', 'frag.rst')}:1: WARNING: unknown document: 'target'"
+    ]
+    if extensions:
+        # The second page used the cached fragment.
+        assert includes.cache
+
+
+def test_toctree_is_not_cached(tmp_path):
+    directory = str(tmp_path)
+    write(directory, "index.rst", "Index\n=====\n\n.. toctree::\n\n   a/page\n   b/page\n   a/target\n   b/target\n")
+    for name in ("a", "b"):
+        write(directory, f"{name}/target.rst", "Target\n======\n")
+        write(directory, f"{name}/page.rst", "Page\n====\n\n.. include:: /inc/frag.rst\n")
+    write(directory, "inc/frag.rst", ".. toctree::\n\n   target\n")
+
+    warnings = build(directory, ["includes"])
+
+    assert "b/target.html" not in read_body(directory, "a/page.html")
+    assert 'href="target.html"' in read_body(directory, "b/page.html")
+    assert not [x for x in includes.cache.values() if x.variants]
+    assert "nonexisting document" not in warnings
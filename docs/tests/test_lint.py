@@ -0,0 +1,19 @@
+import os
+import sys
+from helpers import EXTENSIONS_DIRECTORY
+
+sys.path.insert(0, os.path.dirname(EXTENSIONS_DIRECTORY))
+# After the docs directory is added to the path.
+import lint
+
+
+def test_project_tags_are_known():
+    # Those conf.py checks (eg telemetry), the extensions add and the Makefile passes.
+    assert {"telemetry", "checklinks", "offline", "profiling", "birp", "hdrp", "urp", "stripping", "no-tabs"} \
+        <= lint.KNOWN_TAGS
+
+
+def test_unknown_tag():
+    linter = lint.Linter({})
+    linter.check_condition("page.rst", 1, "telemetry or telemetri", "only expression")
+    assert linter.diagnostics == [("page.rst", 1, "unknown tag 'telemetri' in only expression 'telemetry or telemetri'")]
@@ -0,0 +1,13 @@
+from helpers import build, read_body, write
+
+
+def test_pipeline_tabs_are_marked(tmp_path):
+    directory = str(tmp_path)
+    write(directory, "index.rst", "Index\n=====\n\n.. tab:: HDRP\n\n   H\n\n.. tab:: Other\n\n   O\n")
+
+    build(directory, ["pipelines"])
+
+    body = read_body(directory, "index.html")
+    # The input and the label.
+    assert body.count('data-rp="hdrp"') == 2
+    assert body.count("data-rp=") == 2
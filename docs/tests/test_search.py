@@ -0,0 +1,30 @@
+import json
+import os
+from helpers import build, write
+# After helpers, which adds the extensions to the path.
+from search import get_shard_name, get_shard_prefix
+
+
+def test_shard_names_are_distinct():
+    prefixes = {get_shard_prefix(x, 2) for x in ("_5f", "_x", "Ab", "ab", "aB", "é", "5f")}
+    names = [get_shard_name(x) for x in prefixes]
+    assert len({x.lower() for x in names}) == len(prefixes)
+
+
+def test_shards_are_keyed_by_prefix(tmp_path):
+    directory = str(tmp_path)
+    write(directory, "index.rst", "Index\n=====\n\nThe _private value and the Überwater value.\n")
+
+    build(directory, ["search"], search_shard_prefix_length=1)
+
+    search_directory = os.path.join(directory, "_build", "html", "_search")
+    with open(os.path.join(search_directory, "meta.json"), encoding="utf-8") as file:
+        meta = json.load(file)
+    # The search page looks up the shard by the lowercased prefix of the term.
+    assert meta["shards"]["_"] == "_5f.json"
+    assert meta["shards"]["ü"] == "_fc.json"
+    for prefix, name in meta["shards"].items():
+        with open(os.path.join(search_directory, name), encoding="utf-8") as file:
+            shard = json.load(file)
+        for term in [*shard["terms"], *shard["titleterms"]]:
+            assert term[:1].lower() == prefix
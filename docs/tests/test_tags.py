@@ -0,0 +1,25 @@
+import itertools
+import pytest
+from sphinx.util.tags import Tags
+import helpers  # noqa: F401
+# After helpers, which adds the extensions to the path.
+from tags import compile_condition
+
+CONDITIONS = ("a", "not a", "a and b", "a or b and c", "(a or b) and not c", "not (a and b) or c")
+INVALID_CONDITIONS = ("true", "a and false", "none", "a b", "a and", "1")
+
+
+@pytest.mark.parametrize("condition", CONDITIONS)
+def test_same_as_sphinx(condition):
+    for count in range(4):
+        for tags in itertools.combinations("abc", count):
+            assert compile_condition(condition)(frozenset(tags)) == Tags(list(tags)).eval_condition(condition)
+
+
+@pytest.mark.parametrize("condition", INVALID_CONDITIONS)
+def test_invalid_like_sphinx(condition):
+    # With "a" so Sphinx evaluates the rest rather than stopping at "a and". These are invalid before that here.
+    with pytest.raises(Exception):
+        Tags(["a"]).eval_condition(condition)
+    with pytest.raises(Exception):
+        compile_condition(condition)